@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from synthetic_site import add_site_arguments, generate_site, get_site_options, serve
+
+CLI_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "downloader_cli.py"
+)
+
+
+def run_crawl(url, output_dir, concurrency, crawler_args):
+    """Run one crawl in a child process and return wall time, peak RSS and metrics."""
+    metrics_path = os.path.join(output_dir, "metrics.json")
+    command = [
+        sys.executable,
+        CLI_PATH,
+        url,
+        "--assets",
+        "--render",
+        "never",
+        "--no-progress",
+        "--output",
+        output_dir,
+        "--metrics",
+        metrics_path,
+        "--concurrency",
+        str(concurrency),
+        *crawler_args,
+    ]
+
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stderr=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    wall_time = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode:
+        sys.exit(f"Crawl failed with exit code {process.returncode}: {command}")
+
+    with open(metrics_path) as f:
+        metrics = json.load(f)
+
+    # ru_maxrss is in KiB on Linux. With --workers the crawl runs in
+    # grandchildren, which report their combined peak in the metrics.
+    peak_rss = max(usage.ru_maxrss * 1024, metrics["peak_rss"])
+    return wall_time, peak_rss, metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark crawls of a generated site served locally."
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        nargs="*",
+        default=[1, 4],
+        help="Concurrency levels to run.",
+    )
+    parser.add_argument("-r", "--repeat", type=int, default=1)
+    parser.add_argument("--json", help="Also write the results to this file.")
+    parser.add_argument(
+        "crawler_args",
+        nargs=argparse.REMAINDER,
+        help="Extra downloader-cli arguments, after --.",
+    )
+    add_site_arguments(parser)
+    args = parser.parse_args()
+    crawler_args = [arg for arg in args.crawler_args if arg != "--"]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        site_dir = os.path.join(temp_dir, "site")
+        pages, files = generate_site(site_dir, **get_site_options(args))
+        server = serve(site_dir)
+        url = f"http://127.0.0.1:{server.server_address[1]}/"
+        print(f"Site: {pages} pages, {files} files at {url}")
+        print(
+            f"{'concurrency':>11} {'wall s':>8} {'pages/s':>8} {'MB/s':>7} "
+            f"{'pages':>6} {'assets':>6} {'peak RSS MB':>11}"
+        )
+
+        results = []
+        for concurrency in args.concurrency:
+            for run in range(args.repeat):
+                output_dir = os.path.join(temp_dir, f"out-{concurrency}-{run}")
+                wall_time, peak_rss, metrics = run_crawl(
+                    url, output_dir, concurrency, crawler_args
+                )
+                result = {
+                    "concurrency": concurrency,
+                    "wall_time": round(wall_time, 3),
+                    "pages": metrics["pages"],
+                    "assets": metrics["assets"],
+                    "bytes": metrics["bytes"],
+                    "pages_per_second": round(metrics["pages"] / wall_time, 2),
+                    "bytes_per_second": round(metrics["bytes"] / wall_time, 2),
+                    "peak_rss": peak_rss,
+                    "phases": metrics["phases"],
+                }
+                results.append(result)
+                print(
+                    f"{concurrency:>11} {wall_time:8.2f} "
+                    f"{result['pages_per_second']:8.1f} "
+                    f"{result['bytes_per_second'] / 1024 / 1024:7.2f} "
+                    f"{result['pages']:6} {result['assets']:6} "
+                    f"{peak_rss / 1024 / 1024:11.1f}"
+                )
+                if metrics["pages"] < pages:
+                    print(f"Warning: only {metrics['pages']} of {pages} pages crawled")
+
+        server.shutdown()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+from lib.extractor import EXTRACTORS
+
+
+def generate_page(links, seed=0):
+    rng = random.Random(seed)
+    parts = [
+        "<!DOCTYPE html><html><head><title>Benchmark</title>",
+        '<link rel="stylesheet" href="/css/site.css?1679540672">',
+        '<script src="/js/jquery.min.js"></script>',
+        "<style>.hero { background: url('/img/hero.jpg') }</style>",
+        "</head><body>",
+    ]
+    for i in range(links):
+        parts.append(
+            f'<div class="item" style="background-image: url(/img/bg{i % 50}.png)">'
+            f'<a href="/page/{rng.randrange(10**6)}.html">Page {i}</a>'
+            f'<img src="/img/{i}.jpg" srcset="/img/{i}@2x.jpg 2x, /img/{i}@3x.jpg 3x">'
+            f"<p>{' '.join('lorem' for _ in range(rng.randrange(5, 40)))}</p>"
+            "</div>"
+        )
+        if i % 100 == 0:
+            parts.append(f'<script src="/js/chunk{i}.js"></script>')
+    parts.append("</body></html>")
+    return "".join(parts)
+
+
+def extract_with_beautifulsoup(html):
+    """The BeautifulSoup lookups download_page used before the extractor."""
+    soup = BeautifulSoup(html, "html.parser")
+    assets = []
+    for tag_name, attr_name in [("img", "src"), ("link", "href"), ("script", "src")]:
+        for tag in soup.find_all(tag_name):
+            if tag.get(attr_name):
+                assets.append(tag.get(attr_name))
+
+    links = []
+    for link in soup.find_all("a"):
+        href = link.get("href")
+        if href and not href.startswith("#"):
+            links.append(href)
+    return links, assets
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HTML link extraction.")
+    parser.add_argument("-f", "--file", help="Benchmark a saved HTML page instead.")
+    parser.add_argument("-n", "--links", type=int, default=2000)
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, encoding="utf-8", errors="replace") as f:
+            html = f.read()
+    else:
+        html = generate_page(args.links)
+
+    links, assets = extract_with_beautifulsoup(html)
+    print(f"{len(html) / 1024:.0f} KiB page, {len(links)} links, {len(assets)} assets")
+
+    candidates = [("beautifulsoup", extract_with_beautifulsoup)]
+    for name, extract in EXTRACTORS.items():
+        if not extract:
+            print(f"{name:>14}: not installed")
+            continue
+
+        references = extract(html)
+        if references.links != links or not set(assets) <= set(references.assets):
+            sys.exit(f"{name} found different references than BeautifulSoup")
+        candidates.append((name, extract))
+
+    for name, extract in candidates:
+        seconds = min(
+            timeit.repeat(lambda: extract(html), number=1, repeat=args.repeat)
+        )
+        print(f"{name:>14}: {seconds * 1000:8.1f} ms/page")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+
+import argparse
+import asyncio
+import mimetypes
+import os
+import ssl
+import subprocess
+import tempfile
+import threading
+from urllib.parse import unquote, urlsplit
+
+import h2.config
+import h2.connection
+import h2.events
+import h2.exceptions
+
+
+def create_certificate(directory):
+    """Write a self-signed certificate for localhost and return its paths."""
+    certfile = os.path.join(directory, "cert.pem")
+    keyfile = os.path.join(directory, "key.pem")
+    subprocess.run(
+        [
+            "openssl",
+            "req",
+            "-x509",
+            "-newkey",
+            "rsa:2048",
+            "-nodes",
+            "-days",
+            "1",
+            "-subj",
+            "/CN=localhost",
+            "-addext",
+            "subjectAltName=DNS:localhost,IP:127.0.0.1",
+            "-keyout",
+            keyfile,
+            "-out",
+            certfile,
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return certfile, keyfile
+
+
+def get_file(root, target):
+    """Return the status, content type and body of a GET for target."""
+    path = unquote(urlsplit(target).path)
+    file_path = os.path.normpath(os.path.join(root, path.lstrip("/")))
+    if not file_path.startswith(os.path.abspath(root)):
+        return 404, "text/plain", b""
+    if os.path.isdir(file_path):
+        file_path = os.path.join(file_path, "index.html")
+    if not os.path.isfile(file_path):
+        return 404, "text/plain", b""
+
+    with open(file_path, "rb") as f:
+        body = f.read()
+    content_type = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+    return 200, content_type, body
+
+
+class FileServerProtocol(asyncio.Protocol):
+    """
+    Serve files from root over HTTP/2 or HTTP/1.1, whichever ALPN picked.
+
+    Both protocols share the file handling, so benchmarks compare the
+    protocols and not two server implementations.
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.transport = None
+        self.connection = None
+        self.buffer = b""
+        self.pending = {}
+
+    def connection_made(self, transport):
+        self.transport = transport
+        ssl_object = transport.get_extra_info("ssl_object")
+        if ssl_object and ssl_object.selected_alpn_protocol() == "h2":
+            config = h2.config.H2Configuration(client_side=False)
+            self.connection = h2.connection.H2Connection(config=config)
+            self.connection.initiate_connection()
+            self.transport.write(self.connection.data_to_send())
+
+    def data_received(self, data):
+        if self.connection:
+            self.receive_h2(data)
+        else:
+            self.receive_http1(data)
+
+    def receive_http1(self, data):
+        self.buffer += data
+        while b"\r\n\r\n" in self.buffer:
+            head, self.buffer = self.buffer.split(b"\r\n\r\n", 1)
+            method, target, _ = head.split(b"\r\n", 1)[0].decode().split(" ", 2)
+            status, content_type, body = get_file(self.root, target)
+            headers = (
+                f"HTTP/1.1 {status} {'OK' if status == 200 else 'Not Found'}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n"
+            )
+            self.transport.write(headers.encode())
+            if method != "HEAD":
+                self.transport.write(body)
+
+    def receive_h2(self, data):
+        try:
+            events = self.connection.receive_data(data)
+        except h2.exceptions.ProtocolError:
+            self.transport.write(self.connection.data_to_send())
+            self.transport.close()
+            return
+
+        for event in events:
+            if isinstance(event, h2.events.RequestReceived):
+                self.respond(event.stream_id, dict(event.headers))
+            elif isinstance(event, h2.events.WindowUpdated):
+                self.flush()
+            elif isinstance(event, h2.events.StreamReset):
+                self.pending.pop(event.stream_id, None)
+            elif isinstance(event, h2.events.ConnectionTerminated):
+                self.transport.close()
+        self.transport.write(self.connection.data_to_send())
+
+    def respond(self, stream_id, headers):
+        method = headers[b":method"].decode()
+        status, content_type, body = get_file(self.root, headers[b":path"].decode())
+        self.connection.send_headers(
+            stream_id,
+            [
+                (":status", str(status)),
+                ("content-type", content_type),
+                ("content-length", str(len(body))),
+            ],
+        )
+        self.pending[stream_id] = b"" if method == "HEAD" else body
+        self.flush()
+
+    def flush(self):
+        # Send what the flow control windows allow, the rest on WindowUpdated
+        for stream_id, body in list(self.pending.items()):
+            window = self.connection.local_flow_control_window(stream_id)
+            size = min(window, len(body))
+            while size > 0:
+                chunk_size = min(size, self.connection.max_outbound_frame_size)
+                self.connection.send_data(stream_id, body[:chunk_size])
+                body = body[chunk_size:]
+                size -= chunk_size
+
+            if body:
+                self.pending[stream_id] = body
+            else:
+                self.connection.end_stream(stream_id)
+                del self.pending[stream_id]
+
+
+class FileServer:
+    """TLS file server on a background event loop thread."""
+
+    def __init__(self, root, certfile, keyfile, port=0, protocols=("h2", "http/1.1")):
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(certfile, keyfile)
+        context.set_alpn_protocols(list(protocols))
+
+        self.loop = asyncio.new_event_loop()
+        self.server = self.loop.run_until_complete(
+            self.loop.create_server(
+                lambda: FileServerProtocol(root), "127.0.0.1", port, ssl=context
+            )
+        )
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def shutdown(self):
+        self.loop.call_soon_threadsafe(self.server.close)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve a directory over HTTP/2 and HTTP/1.1 with TLS."
+    )
+    parser.add_argument("root", help="Directory to serve.")
+    parser.add_argument("-p", "--port", type=int, default=8443)
+    parser.add_argument("--cert", help="Certificate file (default: self-signed).")
+    parser.add_argument("--key", help="Private key file.")
+    args = parser.parse_args()
+
+    certfile, keyfile = args.cert, args.key
+    if not certfile:
+        certfile, keyfile = create_certificate(tempfile.mkdtemp())
+
+    server = FileServer(args.root, certfile, keyfile, args.port)
+    print(f"Serving {args.root} on https://127.0.0.1:{server.port}/ ({certfile})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
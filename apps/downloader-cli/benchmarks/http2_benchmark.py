@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import tempfile
+
+from crawl_benchmark import run_crawl
+from h2_server import FileServer, create_certificate
+from synthetic_site import add_site_arguments, generate_site, get_site_options
+
+PROTOCOLS = {"http/1.1": [], "h2": ["--http2"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark asset fetching over pooled HTTP/1.1 and HTTP/2."
+    )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        nargs="*",
+        default=[4, 16],
+        help="Concurrency levels to run, also used as the per-host limit.",
+    )
+    parser.add_argument("-r", "--repeat", type=int, default=1)
+    parser.add_argument("--json", help="Also write the results to this file.")
+    parser.add_argument(
+        "crawler_args",
+        nargs=argparse.REMAINDER,
+        help="Extra downloader-cli arguments, after --.",
+    )
+    add_site_arguments(parser)
+    # Asset-heavy pages of small files, where connection reuse matters most
+    parser.set_defaults(pages=50, assets_per_page=40, asset_size=2048, downloads=0)
+    args = parser.parse_args()
+    crawler_args = [arg for arg in args.crawler_args if arg != "--"]
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        site_dir = os.path.join(temp_dir, "site")
+        pages, files = generate_site(site_dir, **get_site_options(args))
+        certfile, keyfile = create_certificate(temp_dir)
+        server = FileServer(site_dir, certfile, keyfile)
+        url = f"https://127.0.0.1:{server.port}/"
+
+        # Both clients trust the self-signed certificate through the environment
+        os.environ["REQUESTS_CA_BUNDLE"] = certfile
+        os.environ["SSL_CERT_FILE"] = certfile
+
+        print(f"Site: {pages} pages, {files} files at {url}")
+        print(
+            f"{'protocol':>8} {'concurrency':>11} {'wall s':>8} {'assets/s':>9} "
+            f"{'network s':>9} {'peak RSS MB':>11}"
+        )
+
+        results = []
+        for concurrency in args.concurrency:
+            for protocol, protocol_args in PROTOCOLS.items():
+                for run in range(args.repeat):
+                    output_dir = os.path.join(
+                        temp_dir, f"out-{protocol.replace('/', '')}-{concurrency}-{run}"
+                    )
+                    wall_time, peak_rss, metrics = run_crawl(
+                        url,
+                        output_dir,
+                        concurrency,
+                        ["--per-host", str(concurrency), *protocol_args, *crawler_args],
+                    )
+                    result = {
+                        "protocol": protocol,
+                        "concurrency": concurrency,
+                        "wall_time": round(wall_time, 3),
+                        "pages": metrics["pages"],
+                        "assets": metrics["assets"],
+                        "assets_per_second": round(metrics["assets"] / wall_time, 2),
+                        "peak_rss": peak_rss,
+                        "phases": metrics["phases"],
+                    }
+                    results.append(result)
+                    print(
+                        f"{protocol:>8} {concurrency:>11} {wall_time:8.2f} "
+                        f"{result['assets_per_second']:9.1f} "
+                        f"{metrics['phases']['network']['total']:9.2f} "
+                        f"{peak_rss / 1024 / 1024:11.1f}"
+                    )
+
+        server.shutdown()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
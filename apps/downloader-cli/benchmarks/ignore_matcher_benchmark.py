@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+
+import argparse
+import fnmatch
+import os
+import random
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.ignore_matcher import IgnoreMatcher, SOCIAL_MEDIA_PATTERNS
+
+HOSTS = [
+    "example.com",
+    "www.example.com",
+    "cdn2.editmysite.com",
+    "1peter1three.weebly.com",
+    "www.facebook.com",
+    "twitter.com",
+    "ssl.google-analytics.com",
+    "fonts.google.com",
+    "static.xx.fbcdn.net",
+]
+
+
+def fnmatch_is_ignored(url, ignored_patterns):
+    for pattern in ignored_patterns:
+        if fnmatch.fnmatch(url, pattern):
+            return True
+    return False
+
+
+def generate_urls(count, seed=0):
+    rng = random.Random(seed)
+    urls = []
+    for _ in range(count):
+        host = rng.choice(HOSTS)
+        path = "/".join(f"p{rng.randrange(1000)}" for _ in range(rng.randrange(1, 5)))
+        query = f"?v={rng.randrange(10**10)}" if rng.random() < 0.3 else ""
+        urls.append(f"https://{host}/{path}{query}")
+    return urls
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark URL ignore matching.")
+    parser.add_argument("-n", "--urls", type=int, default=20000)
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    parser.add_argument(
+        "-i",
+        "--ignore",
+        nargs="*",
+        default=SOCIAL_MEDIA_PATTERNS,
+        help="List of URL patterns to ignore.",
+    )
+    args = parser.parse_args()
+
+    urls = generate_urls(args.urls)
+    patterns = args.ignore
+    matcher = IgnoreMatcher(patterns)
+
+    mismatches = [
+        url for url in urls if matcher.matches(url) != fnmatch_is_ignored(url, patterns)
+    ]
+    if mismatches:
+        sys.exit(f"Matcher disagrees with fnmatch on {len(mismatches)} URLs")
+
+    ignored = sum(matcher.matches(url) for url in urls)
+    print(f"{len(urls)} URLs, {len(patterns)} patterns, {ignored} ignored")
+
+    for name, is_ignored in [
+        ("fnmatch loop", lambda url: fnmatch_is_ignored(url, patterns)),
+        ("IgnoreMatcher", matcher.matches),
+    ]:
+        seconds = min(
+            timeit.repeat(
+                lambda: [is_ignored(url) for url in urls], number=1, repeat=args.repeat
+            )
+        )
+        print(f"{name:>14}: {seconds / len(urls) * 1e9:8.0f} ns/URL")
+
+
+if __name__ == "__main__":
+    main()
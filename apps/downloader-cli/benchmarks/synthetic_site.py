@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+
+import argparse
+import functools
+import os
+import random
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+
+def write_file(root, path, content):
+    file_path = os.path.join(root, path)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    mode = "wb" if isinstance(content, bytes) else "w"
+    with open(file_path, mode) as f:
+        f.write(content)
+
+
+def get_page_path(index, level):
+    return "index.html" if index == 0 else f"d{level}/p{index}.html"
+
+
+def generate_site(
+    root,
+    pages=500,
+    fanout=10,
+    depth=4,
+    assets_per_page=5,
+    css_files=5,
+    downloads=20,
+    asset_size=4096,
+    seed=0,
+):
+    """
+    Write a static site to root and return the number of pages and files.
+
+    Pages form a tree with fanout links per page, cut off at pages pages or
+    depth levels, and each page also links back to its parent and to a random
+    page so the crawler sees already visited URLs. Images come from a shared
+    pool, stylesheets reference background images with url() and file
+    downloads are linked round-robin. The home page also links to a docs/
+    directory index, without its trailing slash, whose pages link to each
+    other relatively.
+    """
+    rng = random.Random(seed)
+    levels = [0]
+    children = [[]]
+    parents = [None]
+    for index in range(1, pages):
+        parent = (index - 1) // fanout
+        if parent >= len(levels) or levels[parent] + 1 > depth:
+            break
+        levels.append(levels[parent] + 1)
+        children.append([])
+        children[parent].append(index)
+        parents.append(parent)
+
+    paths = [get_page_path(index, level) for index, level in enumerate(levels)]
+    image_count = max(1, len(paths) * assets_per_page // 2)
+    files = 0
+
+    for index in range(image_count):
+        write_file(root, f"assets/img{index}.png", rng.randbytes(asset_size))
+        files += 1
+
+    for index in range(css_files):
+        rules = "".join(
+            f".bg{index}-{rule} {{ background: url('bg{index}-{rule}.png') }}\n"
+            for rule in range(3)
+        )
+        write_file(root, f"css/site{index}.css", rules)
+        for rule in range(3):
+            write_file(
+                root, f"css/bg{index}-{rule}.png", rng.randbytes(asset_size // 2)
+            )
+        files += 4
+
+    for index in range(downloads):
+        write_file(root, f"files/doc{index}.pdf", rng.randbytes(asset_size * 4))
+        files += 1
+
+    for index, path in enumerate(paths):
+        links = [paths[child] for child in children[index]]
+        if parents[index] is not None:
+            links.append(paths[parents[index]])
+        links.append(paths[rng.randrange(len(paths))])
+
+        parts = ["<!DOCTYPE html><html><head>", f"<title>Page {index}</title>"]
+        if css_files:
+            parts.append(
+                f'<link rel="stylesheet" href="/css/site{index % css_files}.css">'
+            )
+        parts.append("</head><body>")
+        parts.append(f"<h1>Page {index}</h1><p>{'lorem ipsum ' * 40}</p>")
+        parts.extend(f'<a href="/{link}">{link}</a>' for link in links)
+        if index == 0:
+            parts.append('<a href="/docs">Docs</a>')
+        parts.extend(
+            f'<img src="/assets/img{rng.randrange(image_count)}.png">'
+            for _ in range(assets_per_page)
+        )
+        if downloads:
+            parts.append(f'<a href="/files/doc{index % downloads}.pdf">Download</a>')
+        parts.append("</body></html>")
+        write_file(root, path, "".join(parts))
+
+    # Relative links only resolve against the URL the server redirects to
+    docs = {
+        "index.html": ["guide.html", "reference.html", "../index.html"],
+        "guide.html": ["./", "reference.html"],
+        "reference.html": ["./", "guide.html"],
+    }
+    for name, links in docs.items():
+        anchors = "".join(f'<a href="{link}">{link}</a>' for link in links)
+        write_file(
+            root,
+            f"docs/{name}",
+            f"<!DOCTYPE html><html><head><title>Docs {name}</title></head>"
+            f"<body><p>{'lorem ipsum ' * 40}</p>{anchors}</body></html>",
+        )
+
+    return len(paths) + len(docs), files
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(root, port=0):
+    """Serve root over HTTP on a background thread and return the server."""
+    handler = functools.partial(QuietHandler, directory=root)
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_site_arguments(parser):
+    parser.add_argument("--pages", type=int, default=500)
+    parser.add_argument("--fanout", type=int, default=10)
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--assets-per-page", type=int, default=5)
+    parser.add_argument("--css-files", type=int, default=5)
+    parser.add_argument("--downloads", type=int, default=20)
+    parser.add_argument("--asset-size", type=int, default=4096)
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def get_site_options(args):
+    return {
+        "pages": args.pages,
+        "fanout": args.fanout,
+        "depth": args.depth,
+        "assets_per_page": args.assets_per_page,
+        "css_files": args.css_files,
+        "downloads": args.downloads,
+        "asset_size": args.asset_size,
+        "seed": args.seed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate and serve a test site.")
+    parser.add_argument("root", help="Directory to write the site to.")
+    parser.add_argument("-p", "--port", type=int, default=8000)
+    add_site_arguments(parser)
+    args = parser.parse_args()
+
+    pages, files = generate_site(args.root, **get_site_options(args))
+    server = serve(args.root, args.port)
+    print(f"Serving {pages} pages and {files} files on http://127.0.0.1:{args.port}/")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
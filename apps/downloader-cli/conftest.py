@@ -0,0 +1 @@
+# Makes lib importable from tests, as it is from downloader_cli.py
@@ -1,45 +1,70 @@
 #!/usr/bin/env python3
 
-import re
 import os
-import time
 import logging
 import requests
-import fnmatch
 import pathlib
-from bs4 import BeautifulSoup
-from urllib.parse import urlparse, urljoin, urlencode, parse_qs, urlunparse
-from playwright.sync_api import sync_playwright
+import functools
+import re
+import hashlib
+import uuid
+from urllib.parse import urlparse, urlsplit, urljoin, urlencode, parse_qs, urlunparse
 import argparse
+import contextlib
+import json
+import math
+import multiprocessing
+import sys
+from lib.archive import OUTPUT_FORMATS, DIR, get_archive_writer
+from lib.blob_store import BlobStore, LINK_MODES, HARDLINK
+from lib.canonical import UrlCanonicalizer, TRACKING_PARAMS, get_canonical_netloc
+from lib.browser_pool import BrowserPool, RESOURCE_TYPES, DEFAULT_BLOCKED_TYPES
+from lib.context import DownloadContext
+from lib.crawler import Crawler, CrawlBudget, PAGE, ASSET, REDIRECT
+from lib.css import CssReferenceCache, get_css_references
+from lib.extractor import EXTRACTOR_NAMES, get_extractor
+from lib.http2 import HTTP2_AVAILABLE, Http2Session
+from lib.ignore_matcher import IgnoreMatcher, SOCIAL_MEDIA_PATTERNS, get_ignore_matcher
+from lib.journal import CrawlJournal
+from lib.metadata import MetadataCache, ContentDigest
+from lib.metrics import ProgressReporter, merge_summaries
+from lib.redirects import (
+    RedirectMap,
+    BROKEN,
+    PERMANENT_REDIRECT_CODES,
+    REDIRECT_CODES,
+)
+from lib.retries import RetryableError, RetryPolicy
+from lib.render import RenderPolicy, RENDER_MODES, AUTO, NEVER, STATIC, SAMPLE
+from lib.scheduler import HostScheduler, parse_retry_after
+from lib.sharding import ShardCrawler, ShardState, get_shard
+from lib.sitemaps import get_robots_sitemaps, iter_sitemap_urls
+from lib.sessions import PooledSession, DEFAULT_TIMEOUT
+from lib.visited import VisitedSet, DiskVisitedSet
+
+STATE_DIR = ".downloader"
 
 LOG_FORMAT = "%(asctime)s.%(msecs)03d %(levelname)s %(funcName)s: %(message)s"
-
-SOCIAL_MEDIA_PATTERNS = [
-    "*adobe.com/*",
-    "*.adobe.com/*",
-    "*facebook.com/*",
-    "*.facebook.com/*",
-    "*twitter.com/*",
-    "*.twitter.com/*",
-    "*instagram.com/*",
-    "*.instagram.com/*",
-    "*linkedin.com/*",
-    "*.linkedin.com/*",
-    "*pinterest.com/*",
-    "*.pinterest.com/*",
-    "*youtube.com/*",
-    "*.youtube.com/*",
-    "*github.com/*",
-    "*.github.com/*",
-    "*codepen.io/*",
-    "*.codepen.io/*",
-    "*apple.com/*",
-    "*.apple.com/*",
-    "*google.com/*",
-    "*.google.com/*",
-]
-
-CSS_URL_PATTERN = re.compile(r'url\(["\']?(.*?)["\']?\)')
+SHARD_LOG_FORMAT = (
+    "%(asctime)s.%(msecs)03d %(levelname)s %(processName)s %(funcName)s: %(message)s"
+)
+
+CHUNK_SIZE = 64 * 1024
+
+# Failures worth retrying, the server or the network may recover
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+TRANSIENT_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError,
+)
+MAX_REDIRECTS = 10
+
+# Declared charset of an HTML document, looked for in its first bytes
+META_CHARSET_PATTERN = re.compile(
+    rb"""<meta[^>]+charset\s*=\s*["']?\s*([\w.:-]+)""", re.I
+)
+META_CHARSET_LIMIT = 1024
 
 DOWNLOADABLE_FILE_EXTENSIONS = [
     ".csv",
@@ -75,17 +100,31 @@ def remove_url_anchor(url):
     return url[: url.find("#")] if "#" in url else url
 
 
+def canonicalize(context, url):
+    if context.canonicalizer:
+        return context.canonicalizer.canonicalize(url)
+    return remove_url_anchor(url)
+
+
 def is_ignored_url(url, ignored_patterns):
-    for pattern in ignored_patterns:
-        if fnmatch.fnmatch(url, pattern):
-            return True
-    return False
+    return get_ignore_matcher(ignored_patterns).matches(url)
+
+
+def get_host(url):
+    # Canonical hosts, so case and default port variants match
+    parts = urlsplit(url)
+    try:
+        return get_canonical_netloc(parts)
+    except ValueError:
+        return parts.netloc
 
 
 def is_same_domain(url1, url2):
-    parsed_url1 = urlparse(url1)
-    parsed_url2 = urlparse(url2)
-    return parsed_url1.netloc == parsed_url2.netloc
+    return get_host(url1) == get_host(url2)
+
+
+def is_stylesheet(url):
+    return urlparse(url).path.lower().endswith(".css")
 
 
 def is_file_download(url):
@@ -95,102 +134,440 @@ def is_file_download(url):
     return False
 
 
-def get_html(url):
+def fetch(context, url, method="GET", **kwargs):
+    with context.metrics.timer("network"):
+        return context.session.request(method, url, **kwargs)
+
+
+def fetch_asset(context, url, **kwargs):
+    """Fetch an asset or document, over the HTTP/2 session when there is one."""
+    if not context.asset_session:
+        return fetch(context, url, **kwargs)
+
+    with context.metrics.timer("network"):
+        return context.asset_session.get(url, **kwargs)
+
+
+def report_response(context, response, *args, **kwargs):
+    retries = getattr(response.raw, "retries", None)
+    context.metrics.record_response(
+        response.url,
+        response.status_code,
+        response.elapsed.total_seconds(),
+        len(retries.history) if retries else 0,
+    )
+
+    if context.scheduler:
+        context.scheduler.report(
+            response.url,
+            response.status_code,
+            response.elapsed.total_seconds(),
+            parse_retry_after(response.headers.get("Retry-After")),
+        )
+
+
+def check_retryable(context, url, response):
+    if response.status_code in RETRY_STATUS_CODES:
+        context.metrics.count("errors")
+        raise RetryableError(
+            f"{url} responded with {response.status_code}",
+            parse_retry_after(response.headers.get("Retry-After")),
+        )
+
+
+def get_retryable_error(context, url, error):
+    context.metrics.count("errors")
+    return RetryableError(f"Failed to fetch {url}: {error}")
+
+
+def fetch_robots_txt(context, url):
+    try:
+        with fetch(context, url) as response:
+            if response.status_code == 200:
+                return response.text
+    except requests.exceptions.RequestException as e:
+        logger.debug(f"Failed to fetch {url}: {e}")
+    return None
+
+
+def open_sitemap(context, url):
     try:
-        with sync_playwright() as p:
-            browser = p.chromium.launch(headless=True)
-            context = browser.new_context()
-            page = context.new_page()
-            page.goto(url)
-            # time.sleep(3)  # Allow time for JavaScript to load
-            html = page.content()
-            browser.close()
-        return html
-    except:
-        logger.critical("Error loading HTML")
-        page.close()
-        context.close()
-        browser.close()
+        response = fetch(context, url, stream=True)
+    except requests.exceptions.RequestException as e:
+        logger.warning(f"Failed to fetch sitemap {url}: {e}")
+        return None
+
+    if response.status_code != 200:
+        logger.debug(f"No sitemap at {url} ({response.status_code})")
+        response.close()
+        return None
+
+    # Undo Content-Encoding, a gzipped .xml.gz file is unpacked by the parser
+    response.raw.decode_content = True
+    return response.raw
+
+
+def get_sitemap_urls(context, url, sitemaps):
+    """The sitemaps given, or else those in robots.txt, or else /sitemap.xml."""
+    if sitemaps:
+        return sitemaps
+
+    parsed_url = urlparse(url)
+    site_url = f"{parsed_url.scheme}://{parsed_url.netloc}"
+    robots_txt = fetch_robots_txt(context, f"{site_url}/robots.txt") or ""
+    return get_robots_sitemaps(robots_txt) or [f"{site_url}/sitemap.xml"]
+
+
+def get_sitemap_seeds(context, url, sitemaps, ignored_patterns, shard=None, shards=1):
+    """
+    Stream the crawlable pages listed in the site's sitemaps as frontier items.
+
+    Sitemap pages are seeds, at depth 0 like the start page. Their lastmod
+    is recorded in the metadata cache so unchanged pages aren't fetched
+    again, and a shard only keeps the pages it owns.
+    """
+    for page_url, lastmod in iter_sitemap_urls(
+        get_sitemap_urls(context, url, sitemaps),
+        functools.partial(open_sitemap, context),
+    ):
+        page_url = canonicalize(context, urljoin(url, page_url))
+        if (
+            not page_url.startswith("http")
+            or not is_same_domain(url, page_url)
+            or is_ignored_url(page_url, ignored_patterns)
+        ):
+            continue
+        if shard is not None and get_shard(page_url, shards) != shard:
+            continue
+
+        if lastmod is not None and context.metadata_cache:
+            context.metadata_cache.set_sitemap_lastmod(page_url, lastmod)
+        yield page_url, PAGE, 0
+
+
+def is_unchanged_in_sitemap(context, url, output_dir):
+    """Whether the sitemap lastmod says our saved copy of url is current."""
+    if not context.metadata_cache:
+        return False
+    if not os.path.exists(get_file_path(url, output_dir)):
         return False
+    return context.metadata_cache.is_unchanged_in_sitemap(url)
 
 
-def save_file(url, content, output_dir):
+def get_page(context, url):
     try:
-        parsed_url = urlparse(url)
-        query_params_str = urlencode(parse_qs(parsed_url.query), doseq=True)
-        query_suffix = f"-{query_params_str}" if query_params_str else ""
-        file_name = os.path.basename(parsed_url.path)
+        with context.metrics.timer("render"):
+            return context.browser_pool.get_page(url)
+    except Exception as e:
+        context.metrics.count("errors")
+        logger.critical(f"Error loading HTML: {e}")
+        return False, {}, url
 
-        if file_name == "":
-            file_name = "index.html"
 
-        url_path = parsed_url.path.lstrip("/").removesuffix(file_name)
-        output_dir = os.path.join(output_dir, parsed_url.netloc, url_path)
-        file_path = os.path.join(output_dir, file_name)
-        file_extension = pathlib.Path(file_path).suffix
+def get_cached_asset(context, url, output_dir):
+    """Body of an asset saved earlier, for the browser to load instead."""
+    if context.archive:
+        return None
 
-        if file_extension == "":
-            output_dir = file_path
-            file_path = os.path.join(file_path, "index.html")
+    file_path = get_file_path(canonicalize(context, url), output_dir)
+    if not os.path.isfile(file_path):
+        return None
 
-        os.makedirs(output_dir, exist_ok=True)
+    with open(file_path, "rb") as f:
+        return f.read()
 
-        if file_path.endswith(".html") or file_path.endswith(".htm"):
-            logger.debug(f"Saving page to {file_path}")
-        else:
-            logger.debug(f"Saving asset to {file_path}")
-        with open(file_path, "wb") as f:
-            f.write(content)
-    except NotADirectoryError as e:
-        logger.critical("Error creating directory")
-        logger.critical(e)
-        temp_file_path = f"{file_path}-temp"
-        os.rename(file_path, temp_file_path)
-        os.makedirs(output_dir, exist_ok=True)
-
-        if file_path.endswith(".html") or file_path.endswith(".htm"):
-            logger.debug(f"Saving page to {file_path}")
-        else:
-            logger.debug(f"Saving asset to {file_path}")
-        with open(file_path, "wb") as f:
-            f.write(content)
 
-        os.rename(temp_file_path, os.path.join(file_path, "index.html"))
-    except IsADirectoryError as e:
-        logger.debug("Error creating file")
-        logger.debug(e)
+def save_browser_asset(
+    context, url, body, headers, output_dir, ignored_patterns, previously_downloaded
+):
+    """Save an asset the browser downloaded while rendering a page."""
+    url = canonicalize(context, url)
+    if url in previously_downloaded or is_ignored_url(url, ignored_patterns):
+        return
+
+    digest = ContentDigest()
+    save_file(context, url, digest.wrap(body), output_dir)
+    record_metadata(context, url, headers, digest)
+    context.metrics.record_download(ASSET, digest.size)
+    logger.debug(f"Saved asset from browser {url}")
+
+    # download_asset queues a stylesheet's nested assets from the cache
+    if is_stylesheet(url):
+        get_stylesheet_references(context, url, output_dir, body, digest.hexdigest())
+    previously_downloaded.add(url)
+
+
+def get_html_text(response):
+    """
+    Decode an HTML response by its Content-Type charset, else its
+    <meta charset>, else the encoding detected from the content.
+    """
+    content = response.content
+    encoding = None
+    if "charset" in response.headers.get("content-type", "").lower():
+        encoding = response.encoding
+    else:
+        match = META_CHARSET_PATTERN.search(content[:META_CHARSET_LIMIT])
+        encoding = match and match.group(1).decode("ascii")
+
+    try:
+        return content.decode(encoding or response.apparent_encoding, errors="replace")
+    except (LookupError, TypeError):
+        # An unknown charset, or nothing detected in empty content
+        return content.decode(response.apparent_encoding or "utf-8", errors="replace")
+
+
+def get_html_page(response):
+    """The HTML of a page response, its headers and the URL it was served from."""
+    content_type = response.headers.get("content-type", "")
+    if response.status_code == 200 and "html" in content_type:
+        return get_html_text(response), response.headers, response.url
+    return None
+
+
+def get_static_page(context, url):
+    try:
+        with fetch(context, url) as response:
+            check_retryable(context, url, response)
+            return get_html_page(response)
+    except TRANSIENT_ERRORS as e:
+        raise get_retryable_error(context, url, e) from e
+    except requests.exceptions.RequestException as e:
+        logger.debug(f"Failed to fetch static HTML for {url}: {e}")
+    return None
+
+
+def fetch_page(context, url, static_page=None):
+    """
+    Return the HTML of a page, its headers and the URL it was served from.
+
+    static_page is the page already fetched over plain HTTP, if any.
+    """
+    if not context.render_policy.try_static(url):
+        return get_page(context, url)
+
+    static_page = static_page or get_static_page(context, url)
+    if not static_page:
+        if context.render_policy.mode == NEVER:
+            return False, {}, url
+        return get_page(context, url)
+
+    static_html = static_page[0]
+    decision = context.render_policy.decide(url, static_html)
+
+    if decision == STATIC:
+        logger.debug(f"Using static HTML for {url}")
+        return static_page
+
+    page = get_page(context, url)
+    if not page[0]:
+        return static_page
+
+    if decision == SAMPLE:
+        context.render_policy.learn(url, static_html, page[0])
+    return page
+
+
+def get_conditional_headers(context, url, output_dir):
+    # Only revalidate content we still have a copy of
+    if context.metadata_cache and os.path.exists(get_file_path(url, output_dir)):
+        return context.metadata_cache.conditional_headers(url)
+    return {}
+
+
+def record_metadata(context, url, headers, digest):
+    if context.metadata_cache:
+        context.metadata_cache.update(url, headers, digest)
+
+
+def get_unchanged_page(context, url, output_dir):
+    """
+    Our saved copy of a page and the URL it is served from, if still current.
+
+    The third value is the new version of a changed page, when revalidating
+    fetched it and it may be used without rendering.
+    """
+    page_url = url
+    if is_unchanged_in_sitemap(context, url, output_dir):
+        logger.debug(f"Sitemap lastmod unchanged, skipping request: {url}")
+    else:
+        headers = get_conditional_headers(context, url, output_dir)
+        if not headers:
+            return None, None, None
+        page_url, static_page = revalidate_page(context, url, headers)
+        if not page_url:
+            return None, None, static_page
+
+    with open(get_file_path(url, output_dir), encoding="utf-8") as f:
+        return f.read(), page_url, None
+
+
+def revalidate_page(context, url, headers):
+    """
+    Conditionally request a page. Returns the URL it is served from after
+    redirects if it's not modified, else None and the new version of the
+    page if it may be used without rendering.
+    """
+    try:
+        with fetch(context, url, headers=headers, stream=True) as response:
+            if response.status_code == 304:
+                return response.url, None
+            if context.render_policy.try_static(url):
+                return None, get_html_page(response)
+    except requests.exceptions.RequestException as e:
+        logger.debug(f"Failed to revalidate {url}: {e}")
+    return None, None
+
+
+def get_file_path(url, output_dir):
+    parsed_url = urlparse(url)
+    query_params_str = urlencode(parse_qs(parsed_url.query), doseq=True)
+    query_suffix = f"-{query_params_str}" if query_params_str else ""
+    file_name = os.path.basename(parsed_url.path)
+
+    if file_name == "":
+        file_name = "index.html"
+
+    url_path = parsed_url.path.lstrip("/").removesuffix(file_name)
+    output_dir = os.path.join(output_dir, parsed_url.netloc, url_path)
+    file_path = os.path.join(output_dir, file_name)
+    file_extension = pathlib.Path(file_path).suffix
+
+    if file_extension == "":
+        file_path = os.path.join(file_path, "index.html")
+
+    if os.path.isdir(file_path):
         file_path = os.path.join(file_path, "index.html")
+
+    return file_path
+
+
+def make_parent_dirs(file_path, output_dir):
+    parent_dir = os.path.dirname(file_path)
+    try:
+        os.makedirs(parent_dir, exist_ok=True)
+        return
+    except (NotADirectoryError, FileExistsError) as e:
+        logger.debug("Error creating directory")
+        logger.debug(e)
+
+    # A page saved as a file is in the way, move it to <page>/index.html
+    root = os.path.abspath(output_dir)
+    conflict_path = os.path.abspath(parent_dir)
+    while conflict_path != root and not os.path.isfile(conflict_path):
+        if conflict_path == os.path.dirname(conflict_path):
+            break
+        conflict_path = os.path.dirname(conflict_path)
+
+    if conflict_path != root and os.path.isfile(conflict_path):
+        temp_file_path = f"{conflict_path}-temp"
+        os.rename(conflict_path, temp_file_path)
+        os.makedirs(parent_dir, exist_ok=True)
+        os.rename(temp_file_path, os.path.join(conflict_path, "index.html"))
+    else:
+        # Nothing to move, another thread may have moved it already
+        os.makedirs(parent_dir, exist_ok=True)
+
+
+def write_file(file_path, content):
+    """
+    Write bytes or an iterable of byte chunks to file_path.
+
+    Chunks are written to a temp file next to the destination which is then
+    renamed into place, so readers never see a partial file and memory use
+    does not depend on the file size.
+    """
+    if isinstance(content, bytes):
+        content = [content]
+
+    temp_file_path = os.path.join(
+        os.path.dirname(file_path), f".{uuid.uuid4().hex}.part"
+    )
+    # Opened before the try, there is nothing to clean up if it fails
+    f = open(temp_file_path, "xb")
+    try:
+        with f:
+            for chunk in content:
+                f.write(chunk)
+        os.replace(temp_file_path, file_path)
+    except BaseException:
+        os.remove(temp_file_path)
+        raise
+
+
+def save_file(context, url, content, output_dir):
+    with context.metrics.timer("save"):
+        return write_content(context, url, content, output_dir)
+
+
+def write_content(context, url, content, output_dir):
+    file_path = get_file_path(url, output_dir)
+
+    if file_path.endswith(".html") or file_path.endswith(".htm"):
         logger.debug(f"Saving page to {file_path}")
-        with open(file_path, "wb") as f:
-            f.write(content)
+    else:
+        logger.debug(f"Saving asset to {file_path}")
 
+    if context.archive:
+        context.archive.write(url, os.path.relpath(file_path, output_dir), content)
+        return file_path
 
-def download_css_assets(
-    css_content,
-    base_url,
-    output_dir,
-    ignored_patterns,
-    previously_downloaded,
-    include_assets=False,
-    follow_redirects=False,
-):
-    asset_urls = CSS_URL_PATTERN.findall(css_content)
-    for asset_url in asset_urls:
-        full_asset_url = urljoin(base_url, asset_url)
-        download_asset(
-            full_asset_url, output_dir, ignored_patterns, previously_downloaded
-        )
+    make_parent_dirs(file_path, output_dir)
+    if context.blob_store:
+        context.blob_store.save(file_path, content)
+    else:
+        write_file(file_path, content)
+
+    return file_path
+
+
+def get_stylesheet_references(context, url, output_dir, content=None, sha256=None):
+    """
+    URLs referenced by a stylesheet, parsed once per URL and content hash.
+
+    Without content, the stylesheet is our saved copy, and its hash comes
+    from the metadata cache so a cache hit doesn't even read the file.
+    Without a hash, the references last parsed for the URL are those of
+    our saved copy, as every saved stylesheet is parsed.
+    """
+    if content is None and sha256 is None and context.metadata_cache:
+        metadata = context.metadata_cache.get(url)
+        sha256 = metadata and metadata["sha256"]
+
+    if context.css_cache and (sha256 or content is None):
+        references = context.css_cache.get(url, sha256)
+        if references is not None:
+            context.metrics.count("css_cache_hits")
+            return references
+
+    if content is None:
+        with open(get_file_path(url, output_dir), "rb") as f:
+            content = f.read()
+
+    with context.metrics.timer("parse"):
+        references = get_css_references(content.decode(errors="replace"))
+    if context.css_cache:
+        context.css_cache.update(url, hashlib.sha256(content).hexdigest(), references)
+    return references
+
+
+def queue_css_assets(css_references, base_url, ignored_patterns, enqueue):
+    asset_urls = []
+    for reference in css_references:
+        asset_url = remove_url_anchor(urljoin(base_url, reference))
+        if not is_ignored_url(asset_url, ignored_patterns):
+            asset_urls.append(asset_url)
+    enqueue(asset_urls, ASSET)
 
 
 def download_document(
+    context,
     url,
     output_dir,
     ignored_patterns,
     previously_downloaded,
-    include_assets=False,
-    follow_redirects=False,
 ):
-    url = remove_url_anchor(url)
+    url = canonicalize(context, url)
     logger.info(f"URL: {url}")
     if url in previously_downloaded:
         return
@@ -198,240 +575,376 @@ def download_document(
     parsed_url = urlparse(url)
     url_no_query = urlunparse(parsed_url._replace(query=""))
 
-    if (
-        not url.startswith("http")
-        or is_ignored_url(url_no_query, ignored_patterns)
-        or url in previously_downloaded
-    ):
+    if not url.startswith("http") or is_ignored_url(url_no_query, ignored_patterns):
         logger.warning(f"Canceling download for {url}")
         return
 
-    try:
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            save_file(url, response.content, output_dir)
-            logger.debug(f"Downloaded document {url}")
-            previously_downloaded.append(url)
+    if is_unchanged_in_sitemap(context, url, output_dir):
+        logger.debug(f"Sitemap lastmod unchanged, skipping document {url}")
+        previously_downloaded.add(url)
+        return
 
+    try:
+        headers = get_conditional_headers(context, url, output_dir)
+        with fetch_asset(context, url, headers=headers, stream=True) as response:
+            if response.status_code == 304:
+                logger.debug(f"Document not modified {url}")
+                previously_downloaded.add(url)
+            elif response.status_code == 200:
+                digest = ContentDigest()
+                content = context.metrics.stream(response.iter_content(CHUNK_SIZE))
+                save_file(context, url, digest.wrap(content), output_dir)
+                record_metadata(context, url, response.headers, digest)
+                context.metrics.record_download(ASSET, digest.size)
+                logger.debug(f"Downloaded document {url}")
+                previously_downloaded.add(url)
+            else:
+                check_retryable(context, url, response)
+
+    except TRANSIENT_ERRORS as e:
+        raise get_retryable_error(context, url, e) from e
     except requests.exceptions.RequestException as e:
-        logger.crtical(f"Failed to download asset {url}: {e}")
+        context.metrics.count("errors")
+        logger.error(f"Failed to download document {url}: {e}")
 
 
 def download_asset(
+    context,
     url,
     output_dir,
     ignored_patterns,
     previously_downloaded,
-    include_assets=False,
-    follow_redirects=False,
+    enqueue,
 ):
-    url = remove_url_anchor(url)
+    url = canonicalize(context, url)
 
     logger.info(f"URL: {url}")
 
     if url in previously_downloaded:
+        # The browser saved the stylesheet, its nested assets are still needed
+        if is_stylesheet(url):
+            queue_css_assets(
+                get_stylesheet_references(context, url, output_dir),
+                url,
+                ignored_patterns,
+                enqueue,
+            )
         return
 
     parsed_url = urlparse(url)
     url_no_query = urlunparse(parsed_url._replace(query=""))
 
-    if (
-        not url.startswith("http")
-        or is_ignored_url(url_no_query, ignored_patterns)
-        or url in previously_downloaded
-    ):
+    if not url.startswith("http") or is_ignored_url(url_no_query, ignored_patterns):
         logger.warning(f"Canceling download for {url}")
         return
 
     try:
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            save_file(url, response.content, output_dir)
-            logger.debug(f"Downloaded asset {url}")
-            previously_downloaded.append(url)
-
-            if url.lower().endswith(".css"):
-                download_css_assets(
-                    response.text,
-                    url,
-                    output_dir,
-                    ignored_patterns,
-                    previously_downloaded,
-                    include_assets,
-                    follow_redirects,
-                )
-
+        headers = get_conditional_headers(context, url, output_dir)
+        with fetch_asset(context, url, headers=headers, stream=True) as response:
+            is_css = is_stylesheet(url)
+
+            if response.status_code == 304:
+                logger.debug(f"Asset not modified {url}")
+                previously_downloaded.add(url)
+                if not is_css:
+                    return
+
+                # Nested assets still need checking, from our copy's references
+                css_references = get_stylesheet_references(context, url, output_dir)
+                base_url = response.url
+            elif response.status_code == 200:
+                # Stylesheets are parsed for nested assets, so keep them in memory
+                if is_css:
+                    with context.metrics.timer("network"):
+                        content = response.content
+                else:
+                    content = context.metrics.stream(response.iter_content(CHUNK_SIZE))
+                digest = ContentDigest()
+                save_file(context, url, digest.wrap(content), output_dir)
+                record_metadata(context, url, response.headers, digest)
+                context.metrics.record_download(ASSET, digest.size)
+                logger.debug(f"Downloaded asset {url}")
+                previously_downloaded.add(url)
+                if is_css:
+                    css_references = get_stylesheet_references(
+                        context, url, output_dir, content, digest.hexdigest()
+                    )
+                    base_url = response.url
+            else:
+                check_retryable(context, url, response)
+                return
+
+            if is_css:
+                # References are relative to where the stylesheet was served from
+                queue_css_assets(css_references, base_url, ignored_patterns, enqueue)
+
+    except TRANSIENT_ERRORS as e:
+        raise get_retryable_error(context, url, e) from e
     except requests.exceptions.RequestException as e:
-        logger.crtical(f"Failed to download asset {url}: {e}")
+        context.metrics.count("errors")
+        logger.error(f"Failed to download asset {url}: {e}")
 
 
-def download_assets(
-    url,
-    output_dir,
-    ignored_patterns,
-    soup,
-    previously_downloaded,
-    include_assets=False,
-    follow_redirects=False,
-):
-    logger.debug(f"Downloading assets on {url}")
-
-    for tag_name, attr_name in [("img", "src"), ("link", "href"), ("script", "src")]:
-        for tag in soup.find_all(tag_name):
-            asset_url = tag.get(attr_name)
-            if asset_url:
-                full_asset_url = urljoin(url, asset_url)
-                download_asset(
-                    full_asset_url,
-                    output_dir,
-                    ignored_patterns,
-                    previously_downloaded,
-                    include_assets,
-                    follow_redirects,
-                )
+def queue_assets(url, references, ignored_patterns, enqueue, base_url=None):
+    logger.debug(f"Queueing assets on {url}")
+
+    asset_urls = []
+    for reference in references.assets:
+        asset_url = remove_url_anchor(urljoin(base_url or url, reference))
+        if not is_ignored_url(asset_url, ignored_patterns):
+            asset_urls.append(asset_url)
+    enqueue(asset_urls, ASSET)
 
 
 def download_page(
+    context,
     url,
     output_dir,
     ignored_patterns,
     previously_downloaded,
+    enqueue,
     include_assets=False,
-    follow_redirects=False,
 ):
-    url = remove_url_anchor(url)
+    url = canonicalize(context, url)
 
     logger.info(f"URL: {url}")
 
-    html = get_html(url)
+    html, page_url, static_page = get_unchanged_page(context, url, output_dir)
+
+    if html is not None:
+        logger.debug(f"Page not modified, skipping render: {url}")
+    else:
+        html, headers, page_url = fetch_page(context, url, static_page)
+        if html:
+            digest = ContentDigest()
+            # Save the original URL content
+            save_file(context, url, digest.wrap(html.encode()), output_dir)
+            record_metadata(context, url, headers, digest)
+            context.metrics.record_download(PAGE, digest.size)
 
     if not html:
         logger.warning(f"HTML could not be loaded for {url}")
     else:
-        soup = BeautifulSoup(html, "html.parser")
-
-        save_file(url, html.encode(), output_dir)  # Save the original URL content
-        previously_downloaded.append(url)  # Track the URL has been downloaded
+        with context.metrics.timer("parse"):
+            references = context.extract_references(html)
+        previously_downloaded.add(url)  # Track the URL has been downloaded
 
-        # Download static assets
+        # Relative references resolve against where the page was served from,
+        # not the canonical URL it is saved under
         if include_assets:
-            download_assets(
-                url,
-                output_dir,
-                ignored_patterns,
-                soup,
-                previously_downloaded,
-                include_assets,
-                follow_redirects,
-            )
+            queue_assets(url, references, ignored_patterns, enqueue, page_url)
 
         # Download pages that were linked to
-        crawl_links(
-            url,
-            output_dir,
-            ignored_patterns,
-            soup,
-            previously_downloaded,
-            include_assets,
-            follow_redirects,
-        )
+        crawl_links(url, references, ignored_patterns, enqueue, page_url)
 
 
-def crawl_links(
-    url,
-    output_dir,
-    ignored_patterns,
-    soup,
-    previously_downloaded,
-    include_assets=False,
-    follow_redirects=False,
-):
+def get_redirect(context, url):
+    """Return the status and redirect target of a URL, without downloading it."""
+    with fetch(context, url, method="HEAD", allow_redirects=False) as response:
+        status_code = response.status_code
+        location = response.headers.get("Location")
+
+    # Some servers refuse HEAD, a streamed GET stops after the headers
+    if status_code in (405, 501):
+        with fetch(context, url, allow_redirects=False, stream=True) as response:
+            status_code = response.status_code
+            location = response.headers.get("Location")
+            check_retryable(context, url, response)
+    else:
+        check_retryable(context, url, response)
+
+    return status_code, urljoin(url, location) if location else None
+
+
+def resolve_redirects(context, url):
+    """
+    Return the URL a link leads to, or None when it is broken.
+
+    Each hop costs one bodiless request, and is remembered in the redirect
+    map so later links to the same URL skip the network. Redirects to
+    other sites are returned without being resolved further. Server errors
+    raise RetryableError.
+    """
+    hops = []
+    while url not in hops and len(hops) <= MAX_REDIRECTS:
+        hops.append(url)
+        target = context.redirect_map.get(url)
+        if target is None:
+            status_code, location = get_redirect(context, url)
+            if status_code in REDIRECT_CODES and location:
+                target = canonicalize(context, location)
+            elif status_code < 400:
+                target = url
+            elif status_code < 500:
+                target = BROKEN
+            else:
+                logger.debug(f"Skipping {url} with status {status_code}")
+                return None
+            context.redirect_map.update(
+                url, target, status_code in PERMANENT_REDIRECT_CODES
+            )
+
+        if target == BROKEN:
+            logger.debug(f"Skipping broken link {url}")
+            return None
+        if target == url or not is_same_domain(url, target):
+            return target
+        logger.debug(f"Redirected {url} to {target}")
+        url = target
+
+    logger.warning(f"Redirect loop or too many redirects from {hops[0]}")
+    return None
+
+
+def crawl_links(url, references, ignored_patterns, enqueue, base_url=None):
     logger.debug(f"Crawling links on {url}")
 
-    for link in soup.find_all("a"):
-        href = link.get("href")
-        if href and not href.startswith("#"):
-            full_url = urljoin(url, href)
-            if (
-                full_url.startswith("http")
-                and is_same_domain(url, full_url)
-                and not is_ignored_url(full_url, ignored_patterns)
-            ):
-                logger.debug(f"Found URL: {full_url}")
-                try:
-                    if follow_redirects == True:
-                        response = requests.get(full_url, timeout=10)
-                        if response.status_code == 200:
-                            logger.debug(f"Downloading original: {full_url}")
-                            download(
-                                full_url,
-                                output_dir,
-                                ignored_patterns,
-                                previously_downloaded,
-                                include_assets,
-                                follow_redirects,
-                            )
-                        elif response.status_code in (301, 302):
-                            redirected_url = response.headers.get("Location")
-                            if redirected_url and not is_ignored_url(
-                                redirected_url, ignored_patterns
-                            ):
-                                logger.debug(f"Redirected to {redirected_url}")
-                                download(
-                                    redirected_url,
-                                    output_dir,
-                                    ignored_patterns,
-                                    previously_downloaded,
-                                    include_assets,
-                                    follow_redirects,
-                                )
-                    else:
-                        logger.debug(f"Downloading without redirects: {full_url}")
-                        download(
-                            full_url,
-                            output_dir,
-                            ignored_patterns,
-                            previously_downloaded,
-                            include_assets,
-                            follow_redirects,
-                        )
-                except requests.exceptions.RequestException as e:
-                    logger.error(f"Failed to download {full_url}: {e}")
+    for href in references.links:
+        full_url = urljoin(base_url or url, href)
+        if (
+            full_url.startswith("http")
+            and is_same_domain(url, full_url)
+            and not is_ignored_url(full_url, ignored_patterns)
+        ):
+            logger.debug(f"Found URL: {full_url}")
+            enqueue(remove_url_anchor(full_url), PAGE)
 
 
 def download(
+    context,
     url,
     output_dir,
     ignored_patterns,
-    previously_downloaded=[],
+    previously_downloaded,
+    enqueue,
     include_assets=False,
     follow_redirects=False,
 ):
     if url in previously_downloaded:
         return
 
+    # Links are resolved as crawl items, so the probes are paced per host
+    if follow_redirects:
+        try:
+            target = resolve_redirects(context, url)
+        except TRANSIENT_ERRORS as e:
+            raise get_retryable_error(context, url, e) from e
+        except requests.exceptions.RequestException as e:
+            context.metrics.count("errors")
+            logger.error(f"Failed to resolve {url}: {e}")
+            return
+
+        if target != url:
+            if (
+                target
+                and is_same_domain(url, target)
+                and not is_ignored_url(target, ignored_patterns)
+            ):
+                enqueue(target, REDIRECT)
+            return
+
     if is_file_download(url):
         download_document(
+            context, url, output_dir, ignored_patterns, previously_downloaded
+        )
+    else:
+        download_page(
+            context,
             url,
             output_dir,
             ignored_patterns,
             previously_downloaded,
+            enqueue,
             include_assets,
-            follow_redirects,
+        )
+
+
+def download_item(
+    url,
+    kind,
+    enqueue,
+    context,
+    output_dir,
+    ignored_patterns,
+    previously_downloaded,
+    include_assets=False,
+    follow_redirects=False,
+):
+    if kind == ASSET:
+        download_asset(
+            context, url, output_dir, ignored_patterns, previously_downloaded, enqueue
         )
     else:
-        download_page(
+        download(
+            context,
             url,
             output_dir,
             ignored_patterns,
             previously_downloaded,
+            enqueue,
             include_assets,
             follow_redirects,
         )
 
 
-def main():
+def crawl(
+    context,
+    url,
+    output_dir,
+    ignored_patterns,
+    previously_downloaded,
+    include_assets=False,
+    follow_redirects=False,
+    concurrency=1,
+    seen=None,
+    journal=None,
+    pending=(),
+    budget=None,
+    shard=None,
+    shard_state=None,
+    sitemaps=None,
+    retry_policy=None,
+    spellings=None,
+):
+    handler = functools.partial(
+        download_item,
+        context=context,
+        output_dir=output_dir,
+        ignored_patterns=ignored_patterns,
+        previously_downloaded=previously_downloaded,
+        include_assets=include_assets,
+        follow_redirects=follow_redirects,
+    )
+    crawler_args = [handler, concurrency, seen, journal, context.scheduler, budget]
+    crawler_options = {
+        "canonicalize": functools.partial(canonicalize, context),
+        "retry_policy": retry_policy,
+        "spellings": spellings,
+    }
+    if shard_state:
+        crawler = ShardCrawler(shard, shard_state, *crawler_args, **crawler_options)
+    else:
+        crawler = Crawler(*crawler_args, **crawler_options)
+    feeds = []
+    if sitemaps is not None:
+        shards = shard_state.shards if shard_state else 1
+        feeds.append(
+            get_sitemap_seeds(context, url, sitemaps, ignored_patterns, shard, shards)
+        )
+
+    crawler.crawl([(remove_url_anchor(url), PAGE, 0)], pending, feeds)
 
+    if retry_policy:
+        context.metrics.count("retries", retry_policy.retries)
+    if crawler.canonical_duplicates:
+        context.metrics.count("canonical_duplicates", crawler.canonical_duplicates)
+        logger.info(
+            f"Skipped {crawler.canonical_duplicates} duplicate URL variants"
+            " after canonicalization"
+        )
+
+
+def get_parser():
     parser = argparse.ArgumentParser(description="Download a website.")
     parser.add_argument("url", help="The URL of the website to download.")
     parser.add_argument(
@@ -452,6 +965,21 @@ def main():
         default="downloaded_files",
         help="The output directory for downloaded files.",
     )
+    parser.add_argument(
+        "-c",
+        "--concurrency",
+        type=int,
+        default=1,
+        help="Number of pages and assets to download at the same time.",
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=1,
+        help="Split the crawl across N processes, each owning a share of the URLs "
+        "(resume with the same number of workers).",
+    )
     parser.add_argument(
         "-i",
         "--ignore",
@@ -459,30 +987,500 @@ def main():
         default=SOCIAL_MEDIA_PATTERNS,
         help="List of URL patterns to ignore.",
     )
-    args = parser.parse_args()
+    parser.add_argument(
+        "--canonicalize",
+        default=True,
+        help="Rewrite URL variants to one canonical URL before de-duplicating them",
+        action=argparse.BooleanOptionalAction,
+    )
+    parser.add_argument(
+        "--strip-param",
+        nargs="*",
+        default=TRACKING_PARAMS,
+        help="Query parameters removed from canonical URLs, as wildcard patterns.",
+    )
+    parser.add_argument(
+        "--strip-trailing-slash",
+        default=False,
+        help="Treat /path/ and /path as the same canonical URL",
+        action=argparse.BooleanOptionalAction,
+    )
+    parser.add_argument(
+        "--visited-store",
+        choices=["memory", "disk"],
+        default="memory",
+        help="Keep the visited-URL index in memory or in SQLite under the output directory.",
+    )
+    parser.add_argument(
+        "-r",
+        "--resume",
+        help="Resume an interrupted crawl from the journal in the output directory",
+        action=argparse.BooleanOptionalAction,
+    )
+    parser.add_argument(
+        "--sitemaps",
+        help="Seed the crawl with the pages in the site's sitemaps, "
+        "listed in robots.txt or at /sitemap.xml",
+        action=argparse.BooleanOptionalAction,
+    )
+    parser.add_argument(
+        "--sitemap",
+        action="append",
+        help="Seed the crawl from this sitemap or sitemap index (implies --sitemaps).",
+    )
+    parser.add_argument(
+        "--max-depth",
+        type=int,
+        help="Only follow links this many clicks away from the start URL.",
+    )
+    parser.add_argument(
+        "--max-pages",
+        type=int,
+        help="Stop crawling new pages after this many.",
+    )
+    parser.add_argument(
+        "--max-bytes",
+        type=int,
+        help="Stop downloading once this many bytes have been saved.",
+    )
+    parser.add_argument(
+        "--time-limit",
+        type=float,
+        help="Stop starting new downloads after this many seconds.",
+    )
+    parser.add_argument(
+        "--pool-hosts",
+        type=int,
+        default=20,
+        help="Number of hosts to keep HTTP connection pools open for.",
+    )
+    parser.add_argument(
+        "--pool-size",
+        type=int,
+        help="Keep-alive connections per host (default: concurrency, at least 10).",
+    )
+    parser.add_argument(
+        "--http2",
+        help="Fetch assets and documents over HTTP/2 where the server supports it",
+        action=argparse.BooleanOptionalAction,
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=DEFAULT_TIMEOUT,
+        help="HTTP request timeout in seconds.",
+    )
+    parser.add_argument(
+        "--incremental",
+        default=True,
+        help="Revalidate previously downloaded URLs with conditional requests",
+        action=argparse.BooleanOptionalAction,
+    )
+    parser.add_argument(
+        "--per-host",
+        type=int,
+        default=4,
+        help="Maximum concurrent requests per host.",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=3,
+        help="Times to retry a URL after a timeout, connection error or 5xx response.",
+    )
+    parser.add_argument(
+        "--retry-budget",
+        type=float,
+        default=0.1,
+        help="Stop retrying once retries exceed this fraction of all requests.",
+    )
+    parser.add_argument(
+        "--breaker-threshold",
+        type=int,
+        default=5,
+        help="Pause a host after this many failed URLs in a row.",
+    )
+    parser.add_argument(
+        "--breaker-cooldown",
+        type=float,
+        default=10.0,
+        help="Seconds to pause a failing host, doubled each time it fails again.",
+    )
+    parser.add_argument(
+        "--delay",
+        type=float,
+        default=0.0,
+        help="Minimum seconds between requests to the same host.",
+    )
+    parser.add_argument(
+        "--robots",
+        default=True,
+        help="Honor the Crawl-delay in each host's robots.txt",
+        action=argparse.BooleanOptionalAction,
+    )
+    parser.add_argument(
+        "--dedup",
+        choices=LINK_MODES,
+        help="Store each distinct body once and link every URL path to it.",
+    )
+    parser.add_argument(
+        "--output-format",
+        choices=OUTPUT_FORMATS,
+        default=DIR,
+        help="Save a file tree, or append records to WARC or zip archives.",
+    )
+    parser.add_argument(
+        "--compress",
+        help="Gzip WARC records or deflate zip entries",
+        action=argparse.BooleanOptionalAction,
+    )
+    parser.add_argument(
+        "--archive-size",
+        type=float,
+        help="Start a new archive once the current one reaches this many MB.",
+    )
+    parser.add_argument(
+        "--render",
+        choices=RENDER_MODES,
+        default=AUTO,
+        help="Render pages in a browser always, never, or only when they need JavaScript.",
+    )
+    parser.add_argument(
+        "--parser",
+        choices=EXTRACTOR_NAMES,
+        default="auto",
+        help="HTML parser used to find links and assets (default: fastest installed).",
+    )
+    parser.add_argument(
+        "--tabs",
+        type=int,
+        help="Number of browser tabs to render pages with (default: concurrency).",
+    )
+    parser.add_argument(
+        "--tab-max-uses",
+        type=int,
+        default=50,
+        help="Recycle a browser tab after this many pages.",
+    )
+    parser.add_argument(
+        "--intercept",
+        default=True,
+        help="Intercept browser requests to block unneeded resources, serve saved "
+        "assets and, with --assets, save the assets the browser downloads",
+        action=argparse.BooleanOptionalAction,
+    )
+    parser.add_argument(
+        "--block",
+        nargs="*",
+        choices=RESOURCE_TYPES,
+        default=DEFAULT_BLOCKED_TYPES,
+        help="Resource types the browser doesn't load when intercepting.",
+    )
+    parser.add_argument(
+        "--progress",
+        default=sys.stderr.isatty(),
+        help="Show a live progress line (default: when stderr is a terminal)",
+        action=argparse.BooleanOptionalAction,
+    )
+    parser.add_argument(
+        "--metrics",
+        help="Write a JSON metrics summary to this file at exit "
+        "(default: metrics.json in the output state directory).",
+    )
+    return parser
 
+
+def run_crawl(args, shard=None, shard_state=None):
+    """
+    Set up the download services and crawl, returning the number of downloads.
+
+    A shard of a multi-process crawl keeps its journal, visited index and
+    metrics in its own state directory.
+    """
     url = args.url
     output_dir = args.output
-    ignored_patterns = args.ignore
+    ignored_patterns = IgnoreMatcher(args.ignore)
     include_assets = args.assets
     follow_redirects = args.follow
-    previously_downloaded = []
+    concurrency = args.concurrency
+
+    state_dir = os.path.join(output_dir, STATE_DIR)
+    if shard is not None:
+        state_dir = os.path.join(state_dir, f"shard-{shard}")
+    os.makedirs(state_dir, exist_ok=True)
 
-    os.makedirs(output_dir, exist_ok=True)
+    if args.visited_store == "disk":
+        previously_downloaded = DiskVisitedSet(os.path.join(state_dir, "downloaded.db"))
+        seen = DiskVisitedSet(os.path.join(state_dir, "seen.db"))
+    else:
+        previously_downloaded = VisitedSet()
+        seen = VisitedSet()
+
+    # URLs as they were found, counting the fetches canonicalization saves
+    spellings = None
+    if args.canonicalize:
+        if args.visited_store == "disk":
+            spellings = DiskVisitedSet(os.path.join(state_dir, "spellings.db"))
+        else:
+            spellings = VisitedSet()
+        spellings.clear()
+
+    budget = None
+    limits = [args.max_depth, args.max_pages, args.max_bytes, args.time_limit]
+    if any(limit is not None for limit in limits):
+        budget = CrawlBudget(*limits, get_bytes=lambda: context.metrics.get("bytes"))
+
+    journal = CrawlJournal(os.path.join(state_dir, "journal.log"), args.resume)
+    pending = []
+
+    if args.resume:
+        pending, queued, done = journal.replay()
+        for queued_url in queued:
+            seen.add(queued_url)
+        for done_url in done:
+            previously_downloaded.add(done_url)
+        logger.info(f"Resuming crawl with {len(pending)} pending URLs")
+    else:
+        previously_downloaded.clear()
+        seen.clear()
+
+    canonicalizer = None
+    if args.canonicalize:
+        canonicalizer = UrlCanonicalizer(
+            args.strip_param, strip_trailing_slash=args.strip_trailing_slash
+        )
 
-    download(
-        url,
+    metadata_cache = None
+    if args.incremental:
+        metadata_cache = MetadataCache(os.path.join(state_dir, "metadata.db"))
+
+    redirect_map = None
+    if follow_redirects:
+        redirect_map = RedirectMap(os.path.join(state_dir, "redirects.db"))
+
+    archive = get_archive_writer(
+        args.output_format,
         output_dir,
-        ignored_patterns,
-        previously_downloaded,
-        include_assets,
-        follow_redirects,
+        args.compress,
+        int(args.archive_size * 1024 * 1024) if args.archive_size else None,
+    )
+    if archive and shard is not None:
+        archive.prefix = f"crawl-{shard}"
+
+    blob_store = None
+    if args.dedup:
+        # Shards share one store, blobs are written and linked atomically
+        blob_store = BlobStore(os.path.join(output_dir, STATE_DIR, "blobs"), args.dedup)
+
+    pool_size = args.pool_size or max(10, concurrency)
+    session = PooledSession(args.pool_hosts, pool_size, args.timeout)
+
+    asset_session = None
+    if args.http2:
+        asset_session = Http2Session(args.pool_hosts * pool_size, args.timeout)
+
+    context = DownloadContext(
+        session,
+        asset_session=asset_session,
+        metadata_cache=metadata_cache,
+        css_cache=CssReferenceCache(os.path.join(state_dir, "css.db")),
+        redirect_map=redirect_map,
+        render_policy=RenderPolicy(args.render),
+        canonicalizer=canonicalizer,
+        extract_references=get_extractor(args.parser),
+        blob_store=blob_store,
+        archive=archive,
     )
 
-    logger.info(
-        f"Downloaded all content: {url} ({len(previously_downloaded)} downloads)"
+    session.hooks["response"].append(functools.partial(report_response, context))
+    if asset_session:
+        asset_session.hooks["response"].append(
+            functools.partial(report_response, context)
+        )
+
+    context.scheduler = HostScheduler(
+        args.per_host,
+        args.delay,
+        breaker_threshold=args.breaker_threshold,
+        breaker_cooldown=args.breaker_cooldown,
+        robots_fetcher=(
+            functools.partial(fetch_robots_txt, context) if args.robots else None
+        ),
+        shards=shard_state.shards if shard_state else 1,
+    )
+    retry_policy = RetryPolicy(
+        args.retries,
+        budget_ratio=args.retry_budget,
+        get_requests=lambda: context.metrics.get("requests"),
     )
 
+    progress = (
+        ProgressReporter(context.metrics) if args.progress else contextlib.nullcontext()
+    )
+
+    interception = {}
+    if args.intercept:
+        interception["block_types"] = args.block
+        interception["lookup"] = functools.partial(
+            get_cached_asset, context, output_dir=output_dir
+        )
+        if include_assets:
+            interception["capture"] = functools.partial(
+                save_browser_asset,
+                context,
+                output_dir=output_dir,
+                ignored_patterns=ignored_patterns,
+                previously_downloaded=previously_downloaded,
+            )
+
+    try:
+        with progress, BrowserPool(
+            args.tabs or concurrency, args.tab_max_uses, **interception
+        ) as browser_pool:
+            context.browser_pool = browser_pool
+            crawl(
+                context,
+                url,
+                output_dir,
+                ignored_patterns,
+                previously_downloaded,
+                include_assets,
+                follow_redirects,
+                concurrency,
+                seen,
+                journal,
+                pending,
+                budget,
+                shard,
+                shard_state,
+                args.sitemap or ([] if args.sitemaps else None),
+                retry_policy,
+                spellings,
+            )
+    finally:
+        session.close()
+        if asset_session:
+            asset_session.close()
+        if archive:
+            archive.close()
+        if metadata_cache:
+            metadata_cache.close()
+        context.css_cache.close()
+        if redirect_map:
+            redirect_map.close()
+        journal.close()
+        downloads = len(previously_downloaded)
+        previously_downloaded.close()
+        seen.close()
+        if spellings is not None:
+            spellings.close()
+
+        context.metrics.count("downloads", downloads)
+        metrics_path = args.metrics or os.path.join(state_dir, "metrics.json")
+        context.metrics.write(metrics_path)
+        logger.info(f"Wrote metrics to {metrics_path}")
+
+    return downloads
+
+
+def run_shard(args, shard, shard_state):
+    """Entry point of a worker process crawling one shard."""
+    logging.basicConfig(format=SHARD_LOG_FORMAT, level=logging.INFO, force=True)
+
+    # Host limits and budgets are shared out between the shards
+    workers = args.workers
+    args.per_host = max(1, args.per_host // workers)
+    args.delay *= workers
+    if args.max_pages is not None:
+        args.max_pages = math.ceil(args.max_pages / workers)
+    if args.max_bytes is not None:
+        args.max_bytes = math.ceil(args.max_bytes / workers)
+    args.progress = False
+    args.metrics = None
+
+    try:
+        run_crawl(args, shard, shard_state)
+    except KeyboardInterrupt:
+        pass
+
+
+def run_workers(args):
+    """
+    Crawl with one process per shard of the URL space.
+
+    Shards forward the URLs they don't own to each other, the coordinator
+    only waits for all work to be done, stops the shards and merges their
+    metrics. Returns the number of downloads.
+    """
+    spawn = multiprocessing.get_context("spawn")
+    shard_state = ShardState(args.workers, spawn)
+    processes = [
+        spawn.Process(
+            target=run_shard, args=(args, shard, shard_state), name=f"shard-{shard}"
+        )
+        for shard in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+
+    try:
+        while not shard_state.done.wait(0.5):
+            if any(process.exitcode for process in processes):
+                logger.error("A crawl worker failed, stopping the crawl")
+                break
+    finally:
+        shard_state.stop()
+        for process in processes:
+            process.join()
+
+    state_dir = os.path.join(args.output, STATE_DIR)
+    summaries = []
+    for shard in range(args.workers):
+        shard_metrics_path = os.path.join(state_dir, f"shard-{shard}", "metrics.json")
+        if os.path.exists(shard_metrics_path):
+            with open(shard_metrics_path) as f:
+                summaries.append(json.load(f))
+
+    summary = merge_summaries(summaries)
+    metrics_path = args.metrics or os.path.join(state_dir, "metrics.json")
+    with open(metrics_path, "w") as f:
+        json.dump(summary, f, indent=2)
+        f.write("\n")
+    logger.info(f"Wrote metrics to {metrics_path}")
+
+    return summary["counters"].get("downloads", 0)
+
+
+def main():
+    parser = get_parser()
+    args = parser.parse_args()
+
+    if args.dedup and args.output_format != DIR:
+        parser.error("--dedup only applies to --output-format dir")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    try:
+        get_extractor(args.parser)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.http2 and not HTTP2_AVAILABLE:
+        parser.error(
+            "--http2 needs httpx with HTTP/2 support: pip install 'httpx[http2]'"
+        )
+
+    os.makedirs(os.path.join(args.output, STATE_DIR), exist_ok=True)
+
+    if args.workers > 1:
+        downloads = run_workers(args)
+    else:
+        downloads = run_crawl(args)
+
+    if args.dedup == HARDLINK:
+        store = BlobStore(os.path.join(args.output, STATE_DIR, "blobs"))
+        logger.debug(f"Pruned {store.prune()} unused blobs")
+
+    logger.info(f"Downloaded all content: {args.url} ({downloads} downloads)")
+
 
 if __name__ == "__main__":
     try:
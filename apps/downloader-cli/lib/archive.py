@@ -0,0 +1,191 @@
+import abc
+import gzip
+import logging
+import mimetypes
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+import zipfile
+from datetime import datetime, timezone
+
+DIR = "dir"
+WARC = "warc"
+ZIP = "zip"
+OUTPUT_FORMATS = [DIR, WARC, ZIP]
+
+BUFFER_SIZE = 1024 * 1024
+SPOOL_LIMIT = 1024 * 1024
+
+logger = logging.getLogger()
+
+
+def get_timestamp():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class ArchiveWriter(abc.ABC):
+    """
+    Appends downloaded bodies as records to one archive file instead of a tree.
+
+    Writes go through a large buffer and each body is spooled (in memory up
+    to SPOOL_LIMIT) before its record is appended under a lock, so concurrent
+    downloads never interleave. Once an archive reaches max_size bytes the
+    next record starts a new numbered archive. Existing archives are never
+    overwritten, a new run or a resume starts at the next free number.
+    """
+
+    extension = ""
+
+    def __init__(self, output_dir, prefix="crawl", compress=False, max_size=None):
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.compress = compress
+        self.max_size = max_size
+        self.index = 0
+        self.file = None
+        self.lock = threading.RLock()
+
+    def get_path(self, index):
+        return os.path.join(
+            self.output_dir, f"{self.prefix}-{index:05d}{self.extension}"
+        )
+
+    def open(self):
+        while os.path.exists(self.get_path(self.index)):
+            self.index += 1
+
+        path = self.get_path(self.index)
+        logger.info(f"Writing archive {path}")
+        self.file = open(path, "xb", buffering=BUFFER_SIZE)
+        self.start_archive()
+
+    def write(self, url, name, content):
+        """Append bytes or an iterable of byte chunks as the record for url."""
+        if isinstance(content, bytes):
+            content = [content]
+
+        with tempfile.SpooledTemporaryFile(SPOOL_LIMIT, dir=self.output_dir) as body:
+            for chunk in content:
+                body.write(chunk)
+            size = body.tell()
+            body.seek(0)
+
+            with self.lock:
+                if not self.file:
+                    self.open()
+                self.write_record(url, name, body, size)
+                if self.max_size and self.file.tell() >= self.max_size:
+                    self.close()
+
+    def close(self):
+        with self.lock:
+            if self.file:
+                self.finish_archive()
+                self.file.close()
+                self.file = None
+
+    def start_archive(self):
+        pass
+
+    @abc.abstractmethod
+    def write_record(self, url, name, body, size):
+        """Append the record of a spooled body of size bytes."""
+
+    def finish_archive(self):
+        pass
+
+
+class WarcWriter(ArchiveWriter):
+    """
+    Writes WARC 1.1 resource records. With compress each record is its own
+    gzip member, the usual .warc.gz layout that lets readers seek to a record.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.extension = ".warc.gz" if self.compress else ".warc"
+
+    def start_archive(self):
+        info = (
+            "software: downloader-cli\r\n" "format: WARC File Format 1.1\r\n"
+        ).encode()
+        headers = {
+            "WARC-Type": "warcinfo",
+            "WARC-Filename": os.path.basename(self.file.name),
+            "Content-Type": "application/warc-fields",
+        }
+        self.write_warc_record(headers, [info], len(info))
+
+    def write_record(self, url, name, body, size):
+        content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        headers = {
+            "WARC-Type": "resource",
+            "WARC-Target-URI": url,
+            "Content-Type": content_type,
+        }
+        self.write_warc_record(headers, body, size)
+
+    def write_warc_record(self, headers, body, size):
+        headers = {
+            "WARC-Record-ID": f"<urn:uuid:{uuid.uuid4()}>",
+            "WARC-Date": get_timestamp(),
+            **headers,
+            "Content-Length": str(size),
+        }
+        header = "WARC/1.1\r\n"
+        header += "".join(f"{key}: {value}\r\n" for key, value in headers.items())
+
+        if self.compress:
+            target = gzip.GzipFile(fileobj=self.file, mode="wb")
+        else:
+            target = self.file
+
+        target.write(f"{header}\r\n".encode())
+        if isinstance(body, list):
+            target.writelines(body)
+        else:
+            shutil.copyfileobj(body, target, BUFFER_SIZE)
+        target.write(b"\r\n\r\n")
+
+        if self.compress:
+            target.close()
+
+
+class ZipWriter(ArchiveWriter):
+    """Writes each body as a zip entry named after its path in the dir layout."""
+
+    extension = ".zip"
+
+    def start_archive(self):
+        compression = zipfile.ZIP_DEFLATED if self.compress else zipfile.ZIP_STORED
+        self.zip = zipfile.ZipFile(self.file, "w", compression, allowZip64=True)
+        self.names = set()
+
+    def write_record(self, url, name, body, size):
+        if name in self.names:
+            logger.debug(f"Skipping duplicate archive entry {name} for {url}")
+            return
+
+        self.names.add(name)
+        info = zipfile.ZipInfo(name, datetime.now().timetuple()[:6])
+        info.compress_type = self.zip.compression
+        info.file_size = size
+        with self.zip.open(info, "w", force_zip64=size >= zipfile.ZIP64_LIMIT) as f:
+            shutil.copyfileobj(body, f, BUFFER_SIZE)
+
+    def finish_archive(self):
+        self.zip.close()
+
+
+ARCHIVE_WRITERS = {WARC: WarcWriter, ZIP: ZipWriter}
+
+
+def get_archive_writer(output_format, output_dir, compress=False, max_size=None):
+    """Return an archive writer for output_format, or None for the dir layout."""
+    if output_format == DIR:
+        return None
+    return ARCHIVE_WRITERS[output_format](
+        output_dir, compress=compress, max_size=max_size
+    )
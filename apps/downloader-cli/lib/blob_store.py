@@ -0,0 +1,132 @@
+import fcntl
+import hashlib
+import logging
+import os
+import shutil
+import uuid
+
+HARDLINK = "hardlink"
+REFLINK = "reflink"
+LINK_MODES = [HARDLINK, REFLINK]
+
+# Linux ioctl cloning a file's extents (copy-on-write) on btrfs, XFS, ...
+FICLONE = 0x40049409
+
+SPOOL_LIMIT = 1024 * 1024
+
+logger = logging.getLogger()
+
+
+def get_temp_path(directory):
+    return os.path.join(directory, f".{uuid.uuid4().hex}.part")
+
+
+class BlobStore:
+    """
+    Content-addressed store of downloaded bodies.
+
+    Each body is kept once under root, named by its SHA-256, and every URL
+    path serving that body is a hardlink (or reflink) to the blob. Bodies up
+    to SPOOL_LIMIT are hashed in memory first, so a duplicate is never
+    written to disk at all.
+    """
+
+    def __init__(self, root, link_mode=HARDLINK):
+        self.root = root
+        self.link_mode = link_mode
+        os.makedirs(root, exist_ok=True)
+
+    def get_blob_path(self, digest):
+        return os.path.join(self.root, digest[:2], digest[2:])
+
+    def save(self, file_path, content):
+        """Store bytes or an iterable of byte chunks and link it to file_path."""
+        if isinstance(content, bytes):
+            content = [content]
+
+        digest = hashlib.sha256()
+        chunks = []
+        size = 0
+        temp = None
+
+        try:
+            for chunk in content:
+                digest.update(chunk)
+                if temp:
+                    temp.write(chunk)
+                    continue
+
+                chunks.append(chunk)
+                size += len(chunk)
+                if size > SPOOL_LIMIT:
+                    temp = open(get_temp_path(self.root), "xb")
+                    temp.writelines(chunks)
+                    chunks = None
+
+            blob_path = self.get_blob_path(digest.hexdigest())
+            if os.path.exists(blob_path):
+                logger.debug(f"Deduplicated {file_path}")
+                self.discard(temp)
+            else:
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                if temp:
+                    temp.close()
+                    os.replace(temp.name, blob_path)
+                else:
+                    self.write_blob(blob_path, chunks)
+        except BaseException:
+            self.discard(temp)
+            raise
+
+        self.link(blob_path, file_path)
+        return blob_path
+
+    def write_blob(self, blob_path, chunks):
+        temp_path = get_temp_path(self.root)
+        with open(temp_path, "xb") as f:
+            f.writelines(chunks)
+        os.replace(temp_path, blob_path)
+
+    def discard(self, temp):
+        if temp:
+            temp.close()
+            os.remove(temp.name)
+
+    def link(self, blob_path, file_path):
+        """Atomically point file_path at the blob, copying if links are unsupported."""
+        if os.path.exists(file_path) and os.path.samefile(file_path, blob_path):
+            # Renaming a hardlink over another link to the same file is a no-op
+            return
+
+        temp_path = get_temp_path(os.path.dirname(file_path))
+        try:
+            if self.link_mode == REFLINK:
+                self.reflink(blob_path, temp_path)
+            else:
+                try:
+                    os.link(blob_path, temp_path)
+                except OSError:
+                    shutil.copyfile(blob_path, temp_path)
+            os.replace(temp_path, file_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def reflink(self, blob_path, temp_path):
+        with open(blob_path, "rb") as source, open(temp_path, "xb") as target:
+            try:
+                fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+            except OSError:
+                shutil.copyfileobj(source, target)
+
+    def prune(self):
+        """Remove hardlinked blobs no longer linked from any URL path."""
+        removed = 0
+        for directory, _, file_names in os.walk(self.root):
+            for file_name in file_names:
+                path = os.path.join(directory, file_name)
+                if os.stat(path).st_nlink == 1:
+                    os.remove(path)
+                    removed += 1
+        return removed
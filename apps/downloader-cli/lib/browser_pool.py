@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import mimetypes
+import threading
+from playwright.async_api import async_playwright
+
+RESOURCE_TYPES = ["image", "media", "font", "stylesheet", "script"]
+DEFAULT_BLOCKED_TYPES = ["image", "media", "font"]
+
+logger = logging.getLogger()
+
+
+class Tab:
+    def __init__(self, context, page):
+        self.context = context
+        self.page = page
+        self.uses = 0
+        self.crashed = False
+        page.on("crash", self.on_crash)
+
+    def on_crash(self, page):
+        logger.warning(f"Browser tab crashed on {page.url}")
+        self.crashed = True
+
+
+class BrowserPool:
+    """
+    Long-lived headless Chromium with a pool of reusable tabs.
+
+    Chromium is launched on first use and Playwright runs on a private event
+    loop thread, so get_page() can be called from any thread. A tab is
+    recycled after max_uses renders or after it crashes or fails, which
+    keeps browser memory bounded.
+
+    Subresource requests can be intercepted: block_types are aborted, as the
+    DOM doesn't need them, lookup(url) may return a cached body to serve
+    instead of the network, and capture(url, body, headers) is handed every
+    successful subresource response. Both callbacks run on worker threads.
+    """
+
+    def __init__(
+        self,
+        size=1,
+        max_uses=50,
+        headless=True,
+        block_types=(),
+        lookup=None,
+        capture=None,
+    ):
+        self.size = max(1, size)
+        self.max_uses = max_uses
+        self.headless = headless
+        self.block_types = set(block_types)
+        self.lookup = lookup
+        self.capture = capture
+        self.loop = None
+        self.thread = None
+        self.playwright = None
+        self.browser = None
+        self.tabs = None
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def start(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+        try:
+            self.submit(self.open())
+        except Exception:
+            self.close()
+            raise
+        return self
+
+    def close(self):
+        if not self.loop:
+            return
+
+        try:
+            self.submit(self.shutdown())
+        except Exception as e:
+            logger.debug(f"Error closing browser: {e}")
+
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.loop = None
+
+    def submit(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def get_page(self, url):
+        """
+        Render a URL in a pooled tab and return its HTML, response headers
+        and the URL the tab ended up on.
+        """
+        with self.lock:
+            # Launch on first use so crawls that never render skip Chromium
+            if not self.loop:
+                self.start()
+        return self.submit(self.render(url))
+
+    async def open(self):
+        self.playwright = await async_playwright().start()
+        await self.launch()
+        self.tabs = asyncio.Queue()
+        for _ in range(self.size):
+            self.tabs.put_nowait(await self.new_tab())
+
+    async def shutdown(self):
+        await self.browser.close()
+        await self.playwright.stop()
+
+    async def launch(self):
+        self.browser = await self.playwright.chromium.launch(headless=self.headless)
+
+    async def new_tab(self):
+        if not self.browser.is_connected():
+            logger.warning("Browser disconnected, relaunching")
+            await self.launch()
+
+        context = await self.browser.new_context()
+        if self.block_types or self.lookup or self.capture:
+            await context.route("**/*", self.intercept)
+        page = await context.new_page()
+        return Tab(context, page)
+
+    async def intercept(self, route):
+        request = route.request
+        resource_type = request.resource_type
+        if resource_type in self.block_types:
+            await route.abort()
+            return
+
+        if request.method != "GET" or resource_type not in RESOURCE_TYPES:
+            await route.continue_()
+            return
+
+        if self.lookup:
+            body = await asyncio.to_thread(self.lookup, request.url)
+            if body is not None:
+                content_type = mimetypes.guess_type(request.url.split("?")[0])[0]
+                headers = {"content-type": content_type} if content_type else {}
+                await route.fulfill(status=200, headers=headers, body=body)
+                return
+
+        if not self.capture:
+            await route.continue_()
+            return
+
+        try:
+            response = await route.fetch()
+            body = await response.body()
+        except Exception as e:
+            logger.debug(f"Error fetching {request.url} for the browser: {e}")
+            await route.continue_()
+            return
+
+        await route.fulfill(response=response, body=body)
+        if response.status == 200:
+            await asyncio.to_thread(self.capture, request.url, body, response.headers)
+
+    async def recycle(self, tab):
+        try:
+            await tab.context.close()
+        except Exception as e:
+            logger.debug(f"Error closing browser context: {e}")
+
+        try:
+            return await self.new_tab()
+        except Exception as e:
+            logger.error(f"Error opening browser tab: {e}")
+            return tab
+
+    async def render(self, url):
+        tab = await self.tabs.get()
+        try:
+            response = await tab.page.goto(url)
+            headers = await response.all_headers() if response else {}
+            return await tab.page.content(), headers, tab.page.url
+        except Exception:
+            tab.crashed = True
+            raise
+        finally:
+            tab.uses += 1
+            if tab.crashed or tab.uses >= self.max_uses:
+                tab = await self.recycle(tab)
+            self.tabs.put_nowait(tab)
@@ -0,0 +1,114 @@
+import posixpath
+import re
+from fnmatch import fnmatchcase
+from urllib.parse import quote, unquote_plus, urlsplit, urlunsplit
+
+TRACKING_PARAMS = [
+    "utm_*",
+    "gclid",
+    "dclid",
+    "gbraid",
+    "wbraid",
+    "fbclid",
+    "msclkid",
+    "yclid",
+    "igshid",
+    "mc_cid",
+    "mc_eid",
+    "_ga",
+    "_gl",
+]
+DEFAULT_PORTS = {"http": 80, "https": 443}
+UNRESERVED = set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~")
+ESCAPE_PATTERN = re.compile(r"%[0-9a-fA-F]{2}")
+# Characters valid in a query parameter, left as they are
+QUERY_SAFE = "/?:@!$'()*+,;=%"
+
+
+def normalize_escape(match):
+    character = chr(int(match.group(0)[1:], 16))
+    return character if character in UNRESERVED else match.group(0).upper()
+
+
+def normalize_path(path, strip_trailing_slash=False):
+    """Resolve dot segments and repeated slashes, and normalize escapes."""
+    path = ESCAPE_PATTERN.sub(normalize_escape, path)
+    if not path or path == "/":
+        return "/"
+
+    trailing_slash = path.endswith("/") or path.endswith("/.")
+    path = posixpath.normpath("/" + path.lstrip("/"))
+    if trailing_slash and not strip_trailing_slash and path != "/":
+        path += "/"
+    return path
+
+
+def normalize_query_part(part):
+    """Normalize escapes and escape invalid characters, keeping everything else."""
+    return quote(ESCAPE_PATTERN.sub(normalize_escape, part), safe=QUERY_SAFE)
+
+
+def get_canonical_netloc(parts):
+    """
+    The netloc of split URL parts with the host lowercased and without the
+    scheme's default port. Raises ValueError for an invalid port.
+    """
+    netloc = (parts.hostname or "").rstrip(".")
+    if ":" in netloc:
+        netloc = f"[{netloc}]"
+    port = parts.port
+    if port is not None and port != DEFAULT_PORTS.get(parts.scheme.lower()):
+        netloc = f"{netloc}:{port}"
+    if parts.username is not None:
+        credentials = parts.netloc.rpartition("@")[0]
+        netloc = f"{credentials}@{netloc}"
+    return netloc
+
+
+class UrlCanonicalizer:
+    """
+    Rewrite URL variants naming the same resource to one canonical URL.
+
+    The scheme and host are lowercased, default ports, fragments and the
+    query parameters matching strip_params (fnmatch patterns) removed, the
+    path normalized and the remaining query parameters sorted. Non-HTTP
+    URLs only lose their fragment.
+    """
+
+    def __init__(
+        self, strip_params=TRACKING_PARAMS, sort_query=True, strip_trailing_slash=False
+    ):
+        self.strip_params = list(strip_params)
+        self.sort_query = sort_query
+        self.strip_trailing_slash = strip_trailing_slash
+
+    def is_stripped(self, name):
+        return any(fnmatchcase(name.lower(), pattern) for pattern in self.strip_params)
+
+    def canonicalize(self, url):
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        if scheme not in DEFAULT_PORTS:
+            return urlunsplit(parts._replace(fragment=""))
+
+        try:
+            netloc = get_canonical_netloc(parts)
+        except ValueError:
+            return urlunsplit(parts._replace(fragment=""))
+
+        query = parts.query
+        if query:
+            # Split by hand, so bare keys and the original encoding are kept
+            params = [
+                (normalize_query_part(name), equals, normalize_query_part(value))
+                for name, equals, value in (
+                    param.partition("=") for param in query.split("&") if param
+                )
+                if not self.is_stripped(unquote_plus(name))
+            ]
+            if self.sort_query:
+                params.sort()
+            query = "&".join("".join(param) for param in params)
+
+        path = normalize_path(parts.path, self.strip_trailing_slash)
+        return urlunsplit((scheme, netloc, path, query, ""))
@@ -0,0 +1,45 @@
+from lib.extractor import get_extractor
+from lib.metrics import Metrics
+from lib.render import RenderPolicy
+
+
+class DownloadContext:
+    """
+    The services shared by every download of a crawl, set up by run_crawl.
+
+    Optional services are None when their feature is off: asset_session
+    without --http2, metadata_cache without --incremental, redirect_map
+    without --follow, canonicalizer without --canonicalize, blob_store
+    without --dedup and archive when saving a file tree. browser_pool is
+    set once the pool is opened, before the crawl starts.
+    """
+
+    def __init__(
+        self,
+        session,
+        asset_session=None,
+        browser_pool=None,
+        metadata_cache=None,
+        css_cache=None,
+        redirect_map=None,
+        render_policy=None,
+        canonicalizer=None,
+        extract_references=None,
+        scheduler=None,
+        blob_store=None,
+        archive=None,
+        metrics=None,
+    ):
+        self.session = session
+        self.asset_session = asset_session
+        self.browser_pool = browser_pool
+        self.metadata_cache = metadata_cache
+        self.css_cache = css_cache
+        self.redirect_map = redirect_map
+        self.render_policy = render_policy or RenderPolicy()
+        self.canonicalizer = canonicalizer
+        self.extract_references = extract_references or get_extractor()
+        self.scheduler = scheduler
+        self.blob_store = blob_store
+        self.archive = archive
+        self.metrics = metrics or Metrics()
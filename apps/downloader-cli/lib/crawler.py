@@ -0,0 +1,310 @@
+import asyncio
+import contextlib
+import itertools
+import logging
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from lib.retries import RetryableError
+
+PAGE = "page"
+ASSET = "asset"
+# A page reached through a redirect, at the depth of the link to it
+REDIRECT = "redirect"
+
+# Frontier order within a depth, pages are crawled before assets
+KIND_PRIORITY = {PAGE: 0, REDIRECT: 0, ASSET: 1}
+
+logger = logging.getLogger()
+
+
+class CrawlBudget:
+    """
+    Limits on how far and how long a crawl runs. None means unlimited.
+
+    max_depth drops pages more than that many links away from the seed.
+    max_pages stops starting new pages once that many have started, while
+    assets of the pages already crawled are still fetched. max_bytes,
+    compared to get_bytes(), and time_limit stop all new work.
+    """
+
+    def __init__(
+        self,
+        max_depth=None,
+        max_pages=None,
+        max_bytes=None,
+        time_limit=None,
+        get_bytes=None,
+        clock=time.monotonic,
+    ):
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.max_bytes = max_bytes
+        self.time_limit = time_limit
+        self.get_bytes = get_bytes
+        self.clock = clock
+        self.started = clock()
+        self.pages = 0
+        self.reasons = set()
+        self.lock = threading.Lock()
+
+    def allows_depth(self, depth):
+        return self.max_depth is None or depth <= self.max_depth
+
+    def get_exhausted(self, kind, retry=False):
+        """Return the limit stopping new work of this kind, or None."""
+        if self.time_limit is not None:
+            if self.clock() - self.started >= self.time_limit:
+                return f"time limit of {self.time_limit}s"
+        if self.max_bytes is not None and self.get_bytes() >= self.max_bytes:
+            return f"byte limit of {self.max_bytes}"
+        if kind == PAGE and not retry and self.max_pages is not None:
+            if self.pages >= self.max_pages:
+                return f"page limit of {self.max_pages}"
+        return None
+
+    def start(self, kind, retry=False):
+        """
+        Claim budget for one work item, returning False if it is exhausted.
+
+        A retried page was already counted against max_pages.
+        """
+        with self.lock:
+            reason = self.get_exhausted(kind, retry)
+            if reason:
+                if reason not in self.reasons:
+                    self.reasons.add(reason)
+                    logger.warning(f"Reached the {reason}, skipping further {kind}s")
+                return False
+
+            if kind == PAGE and not retry:
+                self.pages += 1
+            return True
+
+
+class Crawler:
+    """
+    Crawl engine draining a URL frontier with a bounded pool of asyncio workers.
+
+    Each work item is a (url, kind) pair. The handler is called as
+    handler(url, kind, enqueue) in a worker thread, so blocking fetches run
+    concurrently, and reports newly discovered URLs through enqueue(), one
+    at a time or as a list queued in a single hop to the event loop. With
+    a scheduler, each item first waits for a request slot on its host.
+
+    The frontier is ordered by depth, the number of links followed from a
+    seed (assets share the depth of the page they are on, and redirect
+    targets that of the link), and then pages before assets. A budget limits the depth and stops new work once it
+    runs out. Skipped items stay queued in the journal for a resume.
+
+    A handler raising RetryableError has its item queued again after the
+    retry policy's backoff, and the failure is reported to the scheduler's
+    circuit breaker. Items of a paused host are put back until the pause
+    is over instead of holding a worker, and dropped if the host is given
+    up on.
+
+    With canonicalize, URLs are rewritten to their canonical form before
+    the seen check. canonical_duplicates counts the distinct spellings of
+    a URL beyond the first, the fetches canonicalization saved, when given
+    a spellings index to keep every URL in as it was found.
+    """
+
+    def __init__(
+        self,
+        handler,
+        concurrency=1,
+        seen=None,
+        journal=None,
+        scheduler=None,
+        budget=None,
+        canonicalize=None,
+        retry_policy=None,
+        spellings=None,
+    ):
+        self.handler = handler
+        self.concurrency = max(1, concurrency)
+        self.seen = set() if seen is None else seen
+        self.journal = journal
+        self.scheduler = scheduler
+        self.budget = budget
+        self.canonicalize = canonicalize
+        self.retry_policy = retry_policy
+        self.requeued = set()
+        self.canonical_duplicates = 0
+        self.spellings = spellings
+        self.queue = None
+        self.loop = None
+        self.counter = itertools.count()
+
+    def enqueue(self, url, kind=PAGE, depth=0):
+        """Add a URL to the frontier. Safe to call from worker threads."""
+        self.loop.call_soon_threadsafe(self.add, url, kind, depth)
+
+    def enqueue_all(self, items):
+        """Add (url, kind, depth) items to the frontier in one batch."""
+        self.loop.call_soon_threadsafe(self.add_all, items)
+
+    def add_all(self, items):
+        for url, kind, depth in items:
+            self.add(url, kind, depth)
+
+    def get_canonical_url(self, url):
+        return self.canonicalize(url) if self.canonicalize else url
+
+    def add(self, url, kind=PAGE, depth=0):
+        canonical_url = self.get_canonical_url(url)
+        is_seen = canonical_url in self.seen
+        if self.spellings is not None and url not in self.spellings:
+            # Repeats of one spelling would be de-duplicated anyway
+            self.spellings.add(url)
+            if is_seen:
+                self.canonical_duplicates += 1
+        if is_seen:
+            return False
+        url = canonical_url
+        if self.budget and not self.budget.allows_depth(depth):
+            return False
+
+        self.seen.add(url)
+        if self.journal:
+            self.journal.queued(url, kind, depth)
+        self.put(url, kind, depth)
+        return True
+
+    def put(self, url, kind, depth):
+        # The counter keeps discovery order within a priority
+        priority = (depth, KIND_PRIORITY.get(kind, 0), next(self.counter))
+        self.queue.put_nowait((priority, url, kind))
+
+    def get_enqueue(self, kind, depth):
+        """Return the enqueue function for URLs found while handling an item."""
+
+        def enqueue(urls, child_kind=PAGE):
+            child_depth = depth + 1 if child_kind == PAGE else depth
+            if isinstance(urls, str):
+                self.enqueue(urls, child_kind, child_depth)
+            else:
+                self.enqueue_all([(url, child_kind, child_depth) for url in urls])
+
+        return enqueue
+
+    async def process(self, url, kind, depth=0):
+        """
+        Handle an item, returning None when done, the delay to retry it after,
+        or math.inf when it failed and is left pending for a resume.
+        """
+        if self.scheduler:
+            pause = self.scheduler.get_pause(url)
+            if pause == math.inf:
+                logger.warning(f"Skipping {url}, its host is down")
+            if pause > 0:
+                return pause
+
+        slot = self.scheduler.slot(url) if self.scheduler else contextlib.nullcontext()
+        enqueue = self.get_enqueue(kind, depth)
+        try:
+            async with slot:
+                await self.loop.run_in_executor(None, self.handler, url, kind, enqueue)
+        except RetryableError as e:
+            if self.scheduler:
+                self.scheduler.record_failure(url)
+            delay = None
+            if self.retry_policy:
+                delay = self.retry_policy.get_delay(url, e.retry_after)
+            if delay is None:
+                logger.error(f"Failed to crawl {url}: {e}")
+                return math.inf
+
+            logger.warning(f"Retrying {url} in {delay:.1f}s: {e}")
+            return delay
+        except Exception as e:
+            # Not the host's fault, so neither a success nor a breaker failure
+            logger.error(f"Failed to crawl {url}: {e}")
+            return None
+
+        if self.scheduler:
+            self.scheduler.record_success(url)
+        if self.retry_policy:
+            self.retry_policy.succeeded(url)
+        return None
+
+    async def worker(self):
+        while True:
+            (depth, _, _), url, kind = await self.queue.get()
+            delay = None
+            try:
+                retry = url in self.requeued
+                if self.budget and not self.budget.start(kind, retry):
+                    continue
+
+                self.requeued.discard(url)
+                delay = await self.process(url, kind, depth)
+                if delay is None and self.journal:
+                    self.journal.done(url)
+            finally:
+                if delay is None or delay == math.inf:
+                    self.finish()
+                else:
+                    self.requeue(url, kind, depth, delay)
+
+    def requeue(self, url, kind, depth, delay):
+        # The item is only finished once it is queued again, so the crawl
+        # doesn't end while it waits
+        self.requeued.add(url)
+        self.loop.call_later(delay, self.put_again, url, kind, depth)
+
+    def put_again(self, url, kind, depth):
+        self.put(url, kind, depth)
+        self.finish()
+
+    def finish(self):
+        self.queue.task_done()
+
+    async def wait(self):
+        """Wait until the crawl is over, by default when the frontier is empty."""
+        await self.queue.join()
+
+    async def feed(self, items):
+        """Enqueue (url, kind, depth) items from a blocking iterable on its own thread."""
+
+        def consume():
+            for url, kind, depth in items:
+                self.enqueue(url, kind, depth)
+
+        with ThreadPoolExecutor(1) as executor:
+            try:
+                await self.loop.run_in_executor(executor, consume)
+            except Exception as e:
+                logger.error(f"Failed to read crawl seeds: {e}")
+
+    async def run(self, seeds, pending=(), feeds=()):
+        """
+        Crawl from the seed (url, kind, depth) items until the frontier is empty.
+
+        Pending items are (url, kind, depth) triples restored from a
+        journal. They are already in the seen index, so they are queued
+        without de-duplication. Feeds are iterables of more seeds, like
+        URLs streamed from a sitemap, read while the crawl is running.
+        """
+        self.loop = asyncio.get_running_loop()
+        self.loop.set_default_executor(ThreadPoolExecutor(self.concurrency))
+        self.queue = asyncio.PriorityQueue()
+
+        for url, kind, depth in pending:
+            self.put(url, kind, depth)
+
+        for url, kind, depth in seeds:
+            self.add(url, kind, depth)
+
+        workers = [asyncio.create_task(self.worker()) for _ in range(self.concurrency)]
+        await asyncio.gather(*(self.feed(items) for items in feeds))
+        await self.wait()
+
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+
+    def crawl(self, seeds, pending=(), feeds=()):
+        asyncio.run(self.run(seeds, pending, feeds))
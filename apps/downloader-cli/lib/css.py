@@ -0,0 +1,91 @@
+import json
+import re
+
+from lib.sqlite_store import SqliteStore
+
+COMMENT_PATTERN = re.compile(r"/\*.*?\*/", re.DOTALL)
+IMPORT_PATTERN = re.compile(
+    r"""@import\s+(?:url\(\s*)?(?:"([^"]*)"|'([^']*)'|([^\s"');]+))""",
+    re.IGNORECASE,
+)
+URL_PATTERN = re.compile(
+    r"""\burl\(\s*(?:"([^"]*)"|'([^']*)'|([^\s"')]*))\s*\)""", re.IGNORECASE
+)
+IMAGE_SET_PATTERN = re.compile(r"\bimage-set\(((?:[^()]|\([^()]*\))*)\)", re.IGNORECASE)
+FUNCTION_PATTERN = re.compile(r"[\w-]+\([^()]*\)")
+STRING_PATTERN = re.compile(r""""([^"]*)"|'([^']*)'""")
+
+
+def get_match_url(match):
+    return next(group for group in match.groups() if group is not None).strip()
+
+
+def is_resource_reference(reference):
+    return bool(reference) and not reference.startswith(("#", "data:"))
+
+
+def get_css_references(css):
+    """
+    URLs referenced by a stylesheet, unresolved and in first-seen order.
+
+    Covers @import rules, url() and the bare string candidates of
+    image-set(), skipping comments, data: URIs and SVG fragment refs.
+    """
+    css = COMMENT_PATTERN.sub("", css)
+    references = [get_match_url(match) for match in IMPORT_PATTERN.finditer(css)]
+    references.extend(get_match_url(match) for match in URL_PATTERN.finditer(css))
+
+    for image_set in IMAGE_SET_PATTERN.finditer(css):
+        # url() candidates are matched above, and type("image/avif") isn't a URL
+        candidates = FUNCTION_PATTERN.sub("", image_set.group(1))
+        references.extend(
+            get_match_url(match) for match in STRING_PATTERN.finditer(candidates)
+        )
+
+    return list(dict.fromkeys(filter(is_resource_reference, references)))
+
+
+class CssReferenceCache(SqliteStore):
+    """
+    Per-output-directory cache of the references parsed from stylesheets.
+
+    Entries are keyed by stylesheet URL and the SHA-256 of its content, the
+    same hash the metadata cache records, so a stylesheet is only parsed
+    again once its content changes, even when revalidated in a later run.
+    """
+
+    def __init__(self, path, commit_every=100):
+        super().__init__(
+            path,
+            """
+            CREATE TABLE IF NOT EXISTS css_references (
+                url TEXT PRIMARY KEY,
+                sha256 TEXT,
+                refs TEXT
+            ) WITHOUT ROWID
+            """,
+            commit_every,
+        )
+
+    def get(self, url, sha256=None):
+        """Cached references of url, at this content hash if given, or None."""
+        with self.lock:
+            if sha256 is None:
+                cursor = self.connection.execute(
+                    "SELECT refs FROM css_references WHERE url = ?", (url,)
+                )
+            else:
+                cursor = self.connection.execute(
+                    "SELECT refs FROM css_references WHERE url = ? AND sha256 = ?",
+                    (url, sha256),
+                )
+            row = cursor.fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def update(self, url, sha256, references):
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO css_references VALUES (?, ?, ?)",
+                (url, sha256, json.dumps(references)),
+            )
+            self.wrote()
@@ -0,0 +1,130 @@
+from html.parser import HTMLParser
+
+from lib.css import get_css_references
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+SRC_TAGS = {"img", "script", "source", "video", "audio", "embed", "track"}
+SRCSET_TAGS = {"img", "source"}
+
+
+class PageReferences:
+    """Links and asset URLs referenced by a page, in document order."""
+
+    def __init__(self):
+        self.links = []
+        self.assets = []
+
+    def add_link(self, href):
+        if href and not href.startswith("#"):
+            self.links.append(href)
+
+    def add_asset(self, url):
+        if url:
+            self.assets.append(url)
+
+    def add_element(self, tag, attributes):
+        if tag == "a":
+            self.add_link(attributes.get("href"))
+        elif tag == "link":
+            self.add_asset(attributes.get("href"))
+
+        if tag in SRC_TAGS:
+            self.add_asset(attributes.get("src"))
+        if tag in SRCSET_TAGS and attributes.get("srcset"):
+            for candidate in attributes["srcset"].split(","):
+                self.add_asset(candidate.strip().split(" ")[0])
+        if attributes.get("style"):
+            self.add_css(attributes["style"])
+
+    def add_css(self, css):
+        for url in get_css_references(css):
+            self.add_asset(url)
+
+
+class ReferenceParser(HTMLParser):
+    def __init__(self, references):
+        super().__init__()
+        self.references = references
+        self.in_style = False
+
+    def handle_starttag(self, tag, attrs):
+        self.references.add_element(tag, dict(attrs))
+        self.in_style = tag == "style"
+
+    def handle_endtag(self, tag):
+        self.in_style = False
+
+    def handle_data(self, data):
+        if self.in_style:
+            self.references.add_css(data)
+
+
+def extract_with_html_parser(html):
+    references = PageReferences()
+    parser = ReferenceParser(references)
+    parser.feed(html)
+    parser.close()
+    return references
+
+
+def extract_with_lxml(html):
+    references = PageReferences()
+    if not html.strip():
+        return references
+
+    # Encode first, lxml rejects str input with an XML encoding declaration
+    parser = lxml.html.HTMLParser(encoding="utf-8")
+    document = lxml.html.fromstring(html.encode("utf-8", "replace"), parser=parser)
+    for element in document.iter():
+        if not isinstance(element.tag, str):
+            continue
+
+        references.add_element(element.tag, element.attrib)
+        if element.tag == "style" and element.text:
+            references.add_css(element.text)
+    return references
+
+
+def extract_with_selectolax(html):
+    references = PageReferences()
+    root = LexborHTMLParser(html).root
+    if root is None:
+        return references
+
+    for node in root.traverse():
+        references.add_element(node.tag, node.attributes)
+        if node.tag == "style":
+            references.add_css(node.text())
+    return references
+
+
+EXTRACTORS = {
+    "selectolax": extract_with_selectolax if LexborHTMLParser else None,
+    "lxml": extract_with_lxml if lxml else None,
+    "html.parser": extract_with_html_parser,
+}
+EXTRACTOR_NAMES = ["auto"] + list(EXTRACTORS)
+
+
+def get_extractor(name="auto"):
+    """
+    Return a function extracting PageReferences from HTML in a single pass.
+
+    auto picks the fastest installed backend, falling back to the standard
+    library's html.parser when neither selectolax nor lxml is available.
+    """
+    if name == "auto":
+        return next(extract for extract in EXTRACTORS.values() if extract)
+
+    if not EXTRACTORS.get(name):
+        raise ValueError(f"HTML extractor {name} is not installed")
+    return EXTRACTORS[name]
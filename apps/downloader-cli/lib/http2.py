@@ -0,0 +1,245 @@
+import contextlib
+import datetime
+import socket
+import threading
+import time
+
+import requests
+
+try:
+    import h2  # noqa: F401, httpx needs it for HTTP/2
+    import httpcore
+    import httpx
+except ImportError:
+    httpx = None
+
+from lib.sessions import DEFAULT_TIMEOUT
+
+HTTP2_AVAILABLE = httpx is not None
+DNS_TTL = 300
+
+
+def get_requests_error(error):
+    """The requests exception matching an httpx one, so callers handle both alike."""
+    if isinstance(error, httpx.TimeoutException):
+        return requests.exceptions.Timeout(str(error))
+    if isinstance(error, httpx.TransportError):
+        return requests.exceptions.ConnectionError(str(error))
+    return requests.exceptions.RequestException(str(error))
+
+
+def get_httpx_error(error):
+    """The httpx exception class matching an httpcore one, or None."""
+    errors = [
+        (httpcore.ConnectTimeout, httpx.ConnectTimeout),
+        (httpcore.ReadTimeout, httpx.ReadTimeout),
+        (httpcore.WriteTimeout, httpx.WriteTimeout),
+        (httpcore.PoolTimeout, httpx.PoolTimeout),
+        (httpcore.TimeoutException, httpx.TimeoutException),
+        (httpcore.ConnectError, httpx.ConnectError),
+        (httpcore.ReadError, httpx.ReadError),
+        (httpcore.WriteError, httpx.WriteError),
+        (httpcore.NetworkError, httpx.NetworkError),
+        (httpcore.ProxyError, httpx.ProxyError),
+        (httpcore.UnsupportedProtocol, httpx.UnsupportedProtocol),
+        (httpcore.LocalProtocolError, httpx.LocalProtocolError),
+        (httpcore.RemoteProtocolError, httpx.RemoteProtocolError),
+        (httpcore.ProtocolError, httpx.ProtocolError),
+    ]
+    for httpcore_error, httpx_error in errors:
+        if isinstance(error, httpcore_error):
+            return httpx_error
+    return None
+
+
+@contextlib.contextmanager
+def raising_httpx_errors(request):
+    try:
+        yield
+    except Exception as e:
+        httpx_error = get_httpx_error(e)
+        if httpx_error is None:
+            raise
+        raise httpx_error(str(e), request=request) from e
+
+
+class CachingNetworkBackend(httpcore.SyncBackend if httpx else object):
+    """
+    httpcore network backend resolving each host once per ttl seconds.
+
+    Every address a host resolves to is tried in turn. When none of them
+    connects, the host's addresses are forgotten, so the next attempt
+    resolves it again.
+    """
+
+    def __init__(self, ttl=DNS_TTL, clock=time.monotonic):
+        self.ttl = ttl
+        self.clock = clock
+        self.addresses = {}
+        self.lock = threading.Lock()
+
+    def resolve(self, host, port):
+        with self.lock:
+            addresses, expires = self.addresses.get(host, (None, 0))
+            if addresses and expires > self.clock():
+                return addresses
+
+        infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        with self.lock:
+            self.addresses[host] = (addresses, self.clock() + self.ttl)
+        return addresses
+
+    def connect_tcp(self, host, port, *args, **kwargs):
+        try:
+            addresses = self.resolve(host, port)
+        except OSError as e:
+            raise httpcore.ConnectError(str(e)) from e
+
+        for address in addresses:
+            try:
+                return super().connect_tcp(address, port, *args, **kwargs)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                error = e
+
+        with self.lock:
+            self.addresses.pop(host, None)
+        raise error
+
+
+class PoolResponseStream(httpx.SyncByteStream if httpx else object):
+    """An httpcore response body as an httpx stream."""
+
+    def __init__(self, stream, request):
+        self.stream = stream
+        self.request = request
+
+    def __iter__(self):
+        with raising_httpx_errors(self.request):
+            yield from self.stream
+
+    def close(self):
+        if hasattr(self.stream, "close"):
+            self.stream.close()
+
+
+class PoolTransport(httpx.BaseTransport if httpx else object):
+    """
+    httpx transport sending requests through an httpcore connection pool.
+
+    httpx.HTTPTransport doesn't take a network backend, this transport
+    builds the pool itself so it can use CachingNetworkBackend.
+    """
+
+    def __init__(self, max_connections=100, dns_ttl=DNS_TTL):
+        self.pool = httpcore.ConnectionPool(
+            ssl_context=httpx.create_ssl_context(),
+            max_connections=max_connections,
+            http2=True,
+            network_backend=CachingNetworkBackend(dns_ttl),
+        )
+
+    def handle_request(self, request):
+        core_request = httpcore.Request(
+            method=request.method,
+            url=httpcore.URL(
+                scheme=request.url.raw_scheme,
+                host=request.url.raw_host,
+                port=request.url.port,
+                target=request.url.raw_path,
+            ),
+            headers=request.headers.raw,
+            content=request.stream,
+            extensions=request.extensions,
+        )
+        with raising_httpx_errors(request):
+            response = self.pool.handle_request(core_request)
+
+        return httpx.Response(
+            status_code=response.status,
+            headers=response.headers,
+            stream=PoolResponseStream(response.stream, request),
+            extensions=response.extensions,
+        )
+
+    def close(self):
+        self.pool.close()
+
+
+class Http2Response:
+    """The subset of requests.Response the downloaders use, over an httpx response."""
+
+    def __init__(self, response, elapsed):
+        self.response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.url = str(response.url)
+        self.elapsed = datetime.timedelta(seconds=elapsed)
+        self.raw = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def iter_content(self, chunk_size=None):
+        try:
+            yield from self.response.iter_bytes(chunk_size)
+        except httpx.HTTPError as e:
+            raise get_requests_error(e) from e
+
+    @property
+    def content(self):
+        try:
+            return self.response.read()
+        except httpx.HTTPError as e:
+            raise get_requests_error(e) from e
+
+    @property
+    def text(self):
+        self.content
+        return self.response.text
+
+    def close(self):
+        self.response.close()
+
+
+class Http2Session:
+    """
+    HTTP/2 client multiplexing concurrent requests to a host over one connection.
+
+    Responds like PooledSession to get(url, headers=..., stream=...) and
+    runs its response hooks, and raises requests exceptions, so it can
+    stand in for it. HTTP/2 is negotiated over TLS, plain http:// URLs and
+    servers without HTTP/2 fall back to HTTP/1.1. Host names are resolved
+    once per dns_ttl seconds.
+    """
+
+    def __init__(self, max_connections=100, timeout=DEFAULT_TIMEOUT, dns_ttl=DNS_TTL):
+        self.client = httpx.Client(
+            transport=PoolTransport(max_connections, dns_ttl),
+            timeout=timeout,
+            follow_redirects=True,
+        )
+        self.hooks = {"response": []}
+
+    def get(self, url, headers=None, stream=False, **kwargs):
+        started = time.perf_counter()
+        try:
+            request = self.client.build_request("GET", url, headers=headers, **kwargs)
+            response = self.client.send(request, stream=True)
+        except httpx.HTTPError as e:
+            raise get_requests_error(e) from e
+
+        response = Http2Response(response, time.perf_counter() - started)
+        if not stream:
+            with response:
+                response.content
+
+        for hook in self.hooks["response"]:
+            hook(response)
+        return response
+
+    def close(self):
+        self.client.close()
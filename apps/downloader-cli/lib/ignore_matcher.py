@@ -0,0 +1,103 @@
+import fnmatch
+import functools
+import os
+import re
+
+WILDCARD_CHARACTERS = "*?["
+
+SOCIAL_MEDIA_PATTERNS = [
+    "*adobe.com/*",
+    "*.adobe.com/*",
+    "*facebook.com/*",
+    "*.facebook.com/*",
+    "*twitter.com/*",
+    "*.twitter.com/*",
+    "*instagram.com/*",
+    "*.instagram.com/*",
+    "*linkedin.com/*",
+    "*.linkedin.com/*",
+    "*pinterest.com/*",
+    "*.pinterest.com/*",
+    "*youtube.com/*",
+    "*.youtube.com/*",
+    "*github.com/*",
+    "*.github.com/*",
+    "*codepen.io/*",
+    "*.codepen.io/*",
+    "*apple.com/*",
+    "*.apple.com/*",
+    "*google.com/*",
+    "*.google.com/*",
+]
+
+
+class IgnoreMatcher:
+    """
+    Matches URLs against fnmatch-style ignore patterns in a single pass.
+
+    Patterns shaped like *literal* only check that the literal occurs in the
+    URL, so they are merged into one regex alternation. A literal that
+    contains another one, such as ".facebook.com/" and "facebook.com/", is
+    dropped because the shorter literal already matches it. Every other
+    pattern is translated by fnmatch and merged into a second regex. The
+    results are identical to calling fnmatch.fnmatch for each pattern.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        literals = set()
+        globs = []
+
+        for pattern in self.patterns:
+            pattern = os.path.normcase(pattern)
+            literal = pattern[1:-1]
+            if (
+                len(pattern) >= 2
+                and pattern[0] == "*"
+                and pattern[-1] == "*"
+                and not any(c in WILDCARD_CHARACTERS for c in literal)
+            ):
+                literals.add(literal)
+            else:
+                globs.append(pattern)
+
+        literals = [
+            literal
+            for literal in literals
+            if not any(other != literal and other in literal for other in literals)
+        ]
+
+        self.literal_pattern = None
+        if literals:
+            self.literal_pattern = re.compile(
+                "|".join(re.escape(literal) for literal in sorted(literals))
+            )
+
+        self.glob_pattern = None
+        if globs:
+            self.glob_pattern = re.compile(
+                "|".join(fnmatch.translate(pattern) for pattern in globs)
+            )
+
+    def __iter__(self):
+        return iter(self.patterns)
+
+    def matches(self, url):
+        url = os.path.normcase(url)
+        if self.literal_pattern and self.literal_pattern.search(url):
+            return True
+        if self.glob_pattern and self.glob_pattern.match(url):
+            return True
+        return False
+
+
+@functools.lru_cache(maxsize=32)
+def compile_patterns(patterns):
+    return IgnoreMatcher(patterns)
+
+
+def get_ignore_matcher(patterns):
+    """Return a compiled matcher for a pattern list, reusing earlier compilations."""
+    if isinstance(patterns, IgnoreMatcher):
+        return patterns
+    return compile_patterns(tuple(patterns))
@@ -0,0 +1,86 @@
+import json
+import os
+import time
+
+QUEUED = "queued"
+DONE = "done"
+
+
+class CrawlJournal:
+    """
+    Append-only journal of the crawl frontier.
+
+    Every URL added to the frontier and every URL finished by a worker is
+    recorded as a JSON line. The file is flushed and synced to disk at
+    most every checkpoint_interval seconds, so an interrupted crawl loses
+    at most that much progress and can be resumed from the journal.
+    """
+
+    def __init__(self, path, resume=False, checkpoint_interval=1.0):
+        self.path = path
+        self.checkpoint_interval = checkpoint_interval
+        self.last_checkpoint = time.monotonic()
+        self.file = open(path, "a" if resume else "w", encoding="utf-8")
+
+        if resume and self.file.tell() > 0:
+            # Terminate a partially written last line before appending
+            self.file.write("\n")
+
+    def replay(self):
+        """
+        Read the journal back.
+
+        Returns the URLs that were queued but never finished as a list of
+        (url, kind, depth) triples, the set of every queued URL and the set
+        of finished URLs.
+        """
+        pending = {}
+        queued = set()
+        done = set()
+
+        if not os.path.exists(self.path):
+            return [], queued, done
+
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+
+                try:
+                    event, url, *fields = json.loads(line)
+                except ValueError:
+                    # A crash can leave a partially written last line
+                    continue
+
+                if event == QUEUED:
+                    kind, depth = fields
+                    queued.add(url)
+                    if url not in done:
+                        pending[url] = (kind, depth)
+                elif event == DONE:
+                    done.add(url)
+                    pending.pop(url, None)
+
+        pending = [(url, kind, depth) for url, (kind, depth) in pending.items()]
+        return pending, queued, done
+
+    def write(self, event, url, *fields):
+        self.file.write(json.dumps([event, url, *fields]) + "\n")
+        if time.monotonic() - self.last_checkpoint >= self.checkpoint_interval:
+            self.checkpoint()
+
+    def queued(self, url, kind, depth):
+        self.write(QUEUED, url, kind, depth)
+
+    def done(self, url):
+        self.write(DONE, url)
+
+    def checkpoint(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.last_checkpoint = time.monotonic()
+
+    def close(self):
+        if not self.file.closed:
+            self.checkpoint()
+            self.file.close()
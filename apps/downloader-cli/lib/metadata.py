@@ -0,0 +1,123 @@
+import hashlib
+import time
+
+from lib.sqlite_store import SqliteStore
+
+
+class ContentDigest:
+    """Running size and SHA-256 of a body as it streams through wrap()."""
+
+    def __init__(self):
+        self.hash = hashlib.sha256()
+        self.size = 0
+
+    def wrap(self, content):
+        if isinstance(content, bytes):
+            content = [content]
+
+        for chunk in content:
+            self.hash.update(chunk)
+            self.size += len(chunk)
+            yield chunk
+
+    def hexdigest(self):
+        return self.hash.hexdigest()
+
+
+class MetadataCache(SqliteStore):
+    """
+    Per-output-directory cache of HTTP validators for downloaded URLs.
+
+    Records each URL's ETag, Last-Modified, size and content hash so later
+    runs can send conditional requests and skip unchanged content. The
+    lastmod a sitemap lists for a saved URL is kept alongside, for the
+    current run only, so unchanged URLs skip even the conditional request.
+    """
+
+    def __init__(self, path, commit_every=100):
+        super().__init__(
+            path,
+            """
+            CREATE TABLE IF NOT EXISTS metadata (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                size INTEGER,
+                sha256 TEXT,
+                updated_at REAL,
+                sitemap_lastmod REAL
+            ) WITHOUT ROWID
+            """,
+            commit_every,
+        )
+        with self.lock:
+            # Sitemaps are read again every run
+            self.connection.execute("UPDATE metadata SET sitemap_lastmod = NULL")
+            self.commit()
+
+    def get(self, url):
+        with self.lock:
+            cursor = self.connection.execute(
+                "SELECT etag, last_modified, size, sha256 FROM metadata WHERE url = ?",
+                (url,),
+            )
+            row = cursor.fetchone()
+
+        if row is None:
+            return None
+
+        etag, last_modified, size, sha256 = row
+        return {
+            "etag": etag,
+            "last_modified": last_modified,
+            "size": size,
+            "sha256": sha256,
+        }
+
+    def set_sitemap_lastmod(self, url, lastmod):
+        """Record the lastmod a sitemap lists for url, if it was saved before."""
+        with self.lock:
+            cursor = self.connection.execute(
+                "UPDATE metadata SET sitemap_lastmod = ? WHERE url = ?", (lastmod, url)
+            )
+            if cursor.rowcount:
+                self.wrote()
+
+    def is_unchanged_in_sitemap(self, url):
+        """Whether url was last saved at or after its sitemap lastmod."""
+        with self.lock:
+            cursor = self.connection.execute(
+                "SELECT updated_at, sitemap_lastmod FROM metadata WHERE url = ?",
+                (url,),
+            )
+            row = cursor.fetchone()
+        return row is not None and row[1] is not None and row[0] >= row[1]
+
+    def conditional_headers(self, url):
+        """Return If-None-Match/If-Modified-Since headers for a cached URL."""
+        metadata = self.get(url)
+        headers = {}
+
+        if metadata and metadata["etag"]:
+            headers["If-None-Match"] = metadata["etag"]
+        if metadata and metadata["last_modified"]:
+            headers["If-Modified-Since"] = metadata["last_modified"]
+
+        return headers
+
+    def update(self, url, headers, digest):
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO metadata "
+                "(url, etag, last_modified, size, sha256, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    url,
+                    headers.get("etag"),
+                    headers.get("last-modified"),
+                    digest.size,
+                    digest.hexdigest(),
+                    time.time(),
+                ),
+            )
+            self.wrote()
@@ -0,0 +1,260 @@
+import json
+import logging
+import resource
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+PHASES = ["network", "render", "parse", "save"]
+
+
+class PhaseStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "total": round(self.total, 3),
+            "mean": round(self.total / self.count, 4) if self.count else 0,
+            "max": round(self.max, 3),
+        }
+
+
+class Metrics:
+    """
+    Thread-safe crawl counters and per-phase timings.
+
+    Phase timers record self time: a timer nested inside another on the same
+    thread (like network reads streamed into a save) is subtracted from the
+    outer phase, so phases add up to the time actually spent.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.started = clock()
+        self.counters = Counter()
+        self.status_codes = Counter()
+        self.phases = {phase: PhaseStats() for phase in PHASES}
+        self.hosts = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    @contextmanager
+    def timer(self, phase):
+        stack = self.local.__dict__.setdefault("stack", [])
+        stack.append(0.0)
+        start = self.clock()
+        try:
+            yield
+        finally:
+            elapsed = self.clock() - start
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            with self.lock:
+                self.phases.setdefault(phase, PhaseStats()).add(elapsed - nested)
+
+    def stream(self, chunks, phase="network"):
+        """Yield from chunks, timing each read as phase."""
+        chunks = iter(chunks)
+        while True:
+            with self.timer(phase):
+                chunk = next(chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+
+    def get(self, name):
+        with self.lock:
+            return self.counters[name]
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] += value
+
+    def record_download(self, kind, size):
+        with self.lock:
+            self.counters[f"{kind}s"] += 1
+            self.counters["bytes"] += size
+
+    def record_response(self, url, status, latency, retries=0):
+        host = urlparse(url).netloc
+        with self.lock:
+            self.status_codes[status] += 1
+            self.counters["requests"] += 1
+            self.counters["retries"] += retries
+
+            stats = self.hosts.setdefault(host, PhaseStats())
+            stats.add(latency)
+
+    def get_elapsed(self):
+        return self.clock() - self.started
+
+    def summary(self):
+        elapsed = self.get_elapsed()
+        with self.lock:
+            counters = dict(self.counters)
+            rates = {
+                f"{name}_per_second": round(counters.get(name, 0) / elapsed, 2)
+                for name in ["pages", "assets", "bytes"]
+            }
+            return {
+                "elapsed": round(elapsed, 3),
+                "pages": counters.pop("pages", 0),
+                "assets": counters.pop("assets", 0),
+                "bytes": counters.pop("bytes", 0),
+                **rates,
+                "requests": counters.pop("requests", 0),
+                "retries": counters.pop("retries", 0),
+                "errors": counters.pop("errors", 0),
+                # ru_maxrss is in KiB on Linux
+                "peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+                "counters": counters,
+                "status_codes": {
+                    str(status): count
+                    for status, count in sorted(self.status_codes.items())
+                },
+                "phases": {
+                    phase: stats.summary() for phase, stats in self.phases.items()
+                },
+                "hosts": {host: stats.summary() for host, stats in self.hosts.items()},
+            }
+
+    def progress_line(self):
+        elapsed = max(self.get_elapsed(), 1e-9)
+        with self.lock:
+            pages = self.counters["pages"]
+            assets = self.counters["assets"]
+            size = self.counters["bytes"] / 1024 / 1024
+            errors = self.counters["errors"]
+        return (
+            f"{elapsed:.0f}s {pages} pages ({pages / elapsed:.1f}/s) "
+            f"{assets} assets ({assets / elapsed:.1f}/s) "
+            f"{size:.1f} MB ({size / elapsed:.2f} MB/s) {errors} errors"
+        )
+
+    def write(self, path):
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+            f.write("\n")
+
+
+def merge_stats(stats):
+    count = sum(item["count"] for item in stats)
+    total = sum(item["total"] for item in stats)
+    return {
+        "count": count,
+        "total": round(total, 3),
+        "mean": round(total / count, 4) if count else 0,
+        "max": max((item["max"] for item in stats), default=0),
+    }
+
+
+def merge_summaries(summaries):
+    """Combine the summaries of processes that crawled side by side."""
+    elapsed = max((summary["elapsed"] for summary in summaries), default=0)
+    merged = {"elapsed": elapsed}
+    for name in ["pages", "assets", "bytes"]:
+        merged[name] = sum(summary[name] for summary in summaries)
+    for name in ["pages", "assets", "bytes"]:
+        rate = merged[name] / elapsed if elapsed else 0
+        merged[f"{name}_per_second"] = round(rate, 2)
+    # Processes run side by side, so their peaks add up
+    for name in ["requests", "retries", "errors", "peak_rss"]:
+        merged[name] = sum(summary[name] for summary in summaries)
+
+    counters = Counter()
+    status_codes = Counter()
+    phases = {}
+    hosts = {}
+    for summary in summaries:
+        counters.update(summary["counters"])
+        status_codes.update(summary["status_codes"])
+        for phase, stats in summary["phases"].items():
+            phases.setdefault(phase, []).append(stats)
+        for host, stats in summary["hosts"].items():
+            hosts.setdefault(host, []).append(stats)
+
+    merged["counters"] = dict(counters)
+    merged["status_codes"] = dict(sorted(status_codes.items()))
+    merged["phases"] = {phase: merge_stats(stats) for phase, stats in phases.items()}
+    merged["hosts"] = {host: merge_stats(stats) for host, stats in hosts.items()}
+    return merged
+
+
+class ProgressLogHandler(logging.Handler):
+    """Wraps a log handler writing to the progress stream, keeping the line intact."""
+
+    def __init__(self, reporter, handler):
+        super().__init__()
+        self.reporter = reporter
+        self.handler = handler
+
+    def emit(self, record):
+        with self.reporter.lock:
+            self.reporter.clear()
+            self.handler.handle(record)
+            self.reporter.draw()
+
+
+class ProgressReporter:
+    """
+    Redraws a one-line progress summary on a terminal every interval seconds.
+
+    While it runs, log records written to the same stream clear the line
+    first and redraw it after, so they don't run into each other.
+    """
+
+    def __init__(self, metrics, interval=1.0, stream=sys.stderr):
+        self.metrics = metrics
+        self.interval = interval
+        self.stream = stream
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.handlers = []
+
+    def __enter__(self):
+        logger = logging.getLogger()
+        for handler in logger.handlers[:]:
+            if getattr(handler, "stream", None) is self.stream:
+                wrapper = ProgressLogHandler(self, handler)
+                logger.removeHandler(handler)
+                logger.addHandler(wrapper)
+                self.handlers.append((handler, wrapper))
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+        logger = logging.getLogger()
+        for handler, wrapper in self.handlers:
+            logger.removeHandler(wrapper)
+            logger.addHandler(handler)
+        with self.lock:
+            self.draw()
+        self.stream.write("\n")
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            with self.lock:
+                self.draw()
+
+    def clear(self):
+        self.stream.write("\r\033[K")
+
+    def draw(self):
+        self.stream.write(f"\r\033[K{self.metrics.progress_line()}")
+        self.stream.flush()
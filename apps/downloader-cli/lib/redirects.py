@@ -0,0 +1,45 @@
+from lib.sqlite_store import SqliteStore
+
+PERMANENT_REDIRECT_CODES = (301, 308)
+REDIRECT_CODES = (301, 302, 303, 307, 308)
+# Target of a URL responding with a client error
+BROKEN = ""
+
+
+class RedirectMap(SqliteStore):
+    """
+    Where link URLs lead, so each source URL is resolved only once.
+
+    Every resolution is stored in SQLite, broken URLs with BROKEN as their
+    target. Permanent redirects are kept so later runs skip the request,
+    while temporary redirects, broken URLs and URLs that don't redirect are
+    only kept for the current run, as their target may change.
+    """
+
+    def __init__(self, path, commit_every=100):
+        super().__init__(
+            path,
+            "CREATE TABLE IF NOT EXISTS redirects "
+            "(url TEXT PRIMARY KEY, target TEXT, permanent INTEGER) WITHOUT ROWID",
+            commit_every,
+        )
+        with self.lock:
+            # Only permanent redirects outlive a run
+            self.connection.execute("DELETE FROM redirects WHERE NOT permanent")
+            self.commit()
+
+    def get(self, url):
+        with self.lock:
+            cursor = self.connection.execute(
+                "SELECT target FROM redirects WHERE url = ?", (url,)
+            )
+            row = cursor.fetchone()
+            return row and row[0]
+
+    def update(self, url, target, permanent=False):
+        with self.lock:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO redirects VALUES (?, ?, ?)",
+                (url, target, permanent),
+            )
+            self.wrote()
@@ -0,0 +1,111 @@
+import re
+import threading
+from urllib.parse import urlparse
+
+AUTO = "auto"
+ALWAYS = "always"
+NEVER = "never"
+RENDER_MODES = [AUTO, ALWAYS, NEVER]
+
+STATIC = "static"
+RENDER = "render"
+SAMPLE = "sample"
+
+SPA_ROOT_PATTERN = re.compile(
+    r"<(div|main|app-root)[^>]*\bid=[\"']?(root|app|__next|__nuxt|svelte|ember-app)\b"
+    r"[^>]*>\s*</\1>",
+    re.IGNORECASE,
+)
+NOSCRIPT_PATTERN = re.compile(
+    r"<noscript[^>]*>(?:(?!</noscript>).)*\b(enable|requires?|turn on|need)\b"
+    r"(?:(?!</noscript>).)*javascript",
+    re.IGNORECASE | re.DOTALL,
+)
+BODY_PATTERN = re.compile(r"<body[^>]*>(.*)</body>", re.IGNORECASE | re.DOTALL)
+SCRIPT_STYLE_PATTERN = re.compile(
+    r"<(script|style|template|noscript)[^>]*>.*?</\1>", re.IGNORECASE | re.DOTALL
+)
+TAG_PATTERN = re.compile(r"<[^>]+>")
+ANCHOR_PATTERN = re.compile(r"<a\s", re.IGNORECASE)
+
+MIN_TEXT_LENGTH = 200
+
+
+def get_visible_text(html):
+    match = BODY_PATTERN.search(html)
+    body = match.group(1) if match else html
+    body = SCRIPT_STYLE_PATTERN.sub(" ", body)
+    return " ".join(TAG_PATTERN.sub(" ", body).split())
+
+
+def needs_javascript(html):
+    """Guess whether a server-rendered HTML document only comes alive with JavaScript."""
+    if SPA_ROOT_PATTERN.search(html) or NOSCRIPT_PATTERN.search(html):
+        return True
+
+    text = get_visible_text(html)
+    return len(text) < MIN_TEXT_LENGTH and not ANCHOR_PATTERN.search(html)
+
+
+def count_links(html):
+    return len(ANCHOR_PATTERN.findall(html))
+
+
+class RenderPolicy:
+    """
+    Decides whether a page needs a browser render or a plain HTTP fetch will do.
+
+    In auto mode pages that look static are still rendered and compared with
+    the static HTML until sample_size pages of the host agree. If rendering
+    reveals more links the host is learned as dynamic and rendered without a
+    static fetch, if enough samples agree it is learned as static and trusted.
+    """
+
+    def __init__(self, mode=AUTO, sample_size=3):
+        self.mode = mode
+        self.sample_size = sample_size
+        self.verdicts = {}
+        self.samples = {}
+        self.lock = threading.Lock()
+
+    def try_static(self, url):
+        """Whether to fetch the page over plain HTTP before rendering it."""
+        if self.mode == ALWAYS:
+            return False
+        if self.mode == NEVER:
+            return True
+        return self.verdicts.get(urlparse(url).netloc) != RENDER
+
+    def decide(self, url, html):
+        """Return STATIC, RENDER or SAMPLE for a statically fetched page."""
+        if self.mode == NEVER:
+            return STATIC
+
+        host = urlparse(url).netloc
+        if needs_javascript(html):
+            self.record(host, RENDER)
+            return RENDER
+        if self.verdicts.get(host) == STATIC:
+            return STATIC
+        return SAMPLE
+
+    def learn(self, url, static_html, rendered_html):
+        """Record a sampled comparison of the static and rendered page."""
+        host = urlparse(url).netloc
+        if count_links(rendered_html) > count_links(static_html) * 1.2 + 2:
+            with self.lock:
+                self.verdicts.setdefault(host, RENDER)
+        else:
+            self.record(host, STATIC)
+
+    def record(self, host, verdict):
+        with self.lock:
+            if host in self.verdicts:
+                return
+
+            previous, count = self.samples.get(host, (verdict, 0))
+            count = count + 1 if previous == verdict else 1
+            self.samples[host] = (verdict, count)
+
+            if count >= self.sample_size:
+                self.verdicts[host] = verdict
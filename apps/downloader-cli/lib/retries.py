@@ -0,0 +1,81 @@
+import logging
+import random
+import threading
+
+logger = logging.getLogger()
+
+
+class RetryableError(Exception):
+    """A transient failure, like a timeout or a 5xx, worth trying again later."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RetryPolicy:
+    """
+    Decides whether and when a failed work item is tried again.
+
+    Each URL gets up to max_retries retries, delayed by full-jitter
+    exponential backoff: a random time up to base_delay doubled per retry,
+    capped at max_delay, so the retries after an outage don't arrive in
+    waves. Retry-After is honored as a minimum.
+
+    The retry budget caps all retries at min_retries plus budget_ratio of
+    the requests made so far, as counted by get_requests(), so a failing
+    site can't multiply the crawl's traffic.
+    """
+
+    def __init__(
+        self,
+        max_retries=3,
+        base_delay=1.0,
+        max_delay=60.0,
+        budget_ratio=0.1,
+        min_retries=10,
+        get_requests=None,
+        random=random.random,
+    ):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_ratio = budget_ratio
+        self.min_retries = min_retries
+        self.get_requests = get_requests
+        self.random = random
+        self.attempts = {}
+        self.retries = 0
+        self.exhausted = False
+        self.lock = threading.Lock()
+
+    def has_budget(self):
+        requests = self.get_requests() if self.get_requests else 0
+        return self.retries < self.min_retries + self.budget_ratio * requests
+
+    def get_delay(self, url, retry_after=None):
+        """Claim a retry of url and return its delay, or None to give up."""
+        with self.lock:
+            attempt = self.attempts.get(url, 0)
+            if attempt >= self.max_retries:
+                self.attempts.pop(url, None)
+                return None
+
+            if not self.has_budget():
+                if not self.exhausted:
+                    self.exhausted = True
+                    logger.warning("Retry budget exhausted, no longer retrying")
+                self.attempts.pop(url, None)
+                return None
+
+            self.attempts[url] = attempt + 1
+            self.retries += 1
+
+        delay = self.random() * min(self.max_delay, self.base_delay * 2**attempt)
+        if retry_after:
+            delay = max(delay, min(self.max_delay, retry_after))
+        return delay
+
+    def succeeded(self, url):
+        with self.lock:
+            self.attempts.pop(url, None)
@@ -0,0 +1,304 @@
+import asyncio
+import email.utils
+import logging
+import math
+import threading
+import time
+import urllib.robotparser
+from contextlib import asynccontextmanager
+from urllib.parse import urlparse
+
+THROTTLE_STATUS_CODES = (429, 503)
+
+logger = logging.getLogger()
+
+
+def parse_retry_after(value, now=None):
+    """Convert a Retry-After header, in seconds or as an HTTP date, to seconds."""
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at - (time.time() if now is None else now))
+
+
+class TokenBucket:
+    """
+    Token bucket where acquiring reserves a token and returns how long to wait.
+
+    Reserving ahead of time lets concurrent callers queue up in order, each
+    sleeping for its own share of the delay. A rate of None never waits.
+    """
+
+    def __init__(self, rate=None, capacity=1, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.updated = clock()
+
+    def refill(self):
+        now = self.clock()
+        if self.rate:
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+        self.updated = now
+
+    def reserve(self):
+        if not self.rate:
+            return 0
+
+        self.refill()
+        self.tokens -= 1
+        return max(0, -self.tokens / self.rate)
+
+    def set_rate(self, rate):
+        self.refill()
+        self.rate = rate
+        if not rate:
+            self.tokens = self.capacity
+
+
+class HostState:
+    def __init__(self, limit, delay, clock):
+        self.limit = limit
+        self.base_delay = delay
+        self.delay = delay
+        self.bucket = TokenBucket(1 / delay if delay else None, clock=clock)
+        self.active = 0
+        self.waiters = []
+        self.paused_until = 0
+        self.failures = 0
+        self.opens = 0
+        self.open_until = 0
+        self.probing = False
+
+    def set_delay(self, delay):
+        self.delay = delay
+        self.bucket.set_rate(1 / delay if delay else None)
+
+
+class HostScheduler:
+    """
+    Per-host politeness for concurrent crawls.
+
+    Each host gets a concurrency cap and a token bucket spacing out request
+    starts by the robots.txt Crawl-delay or min_delay, whichever is larger.
+    Throttling responses (429/503) halve the host's concurrency, double its
+    delay and honor Retry-After. Fast healthy responses grow concurrency
+    back up to max_per_host and shrink the delay back to its base.
+
+    A circuit breaker pauses a host after breaker_threshold consecutive
+    failed work items, for breaker_cooldown seconds doubled on each
+    consecutive opening. Once the pause is over a single probe item is let
+    through, closing the breaker if it succeeds. After breaker_max_opens
+    consecutive openings the host is given up on.
+
+    When a crawl is sharded across processes, each with its own scheduler,
+    shards is their number: the Crawl-delay and throttling delays are
+    multiplied by it so the shards together keep to the host's rate.
+
+    clock and sleep are injectable so the scheduler can run on a fake clock.
+    """
+
+    def __init__(
+        self,
+        max_per_host=4,
+        min_delay=0.0,
+        max_delay=60.0,
+        latency_target=2.0,
+        breaker_threshold=5,
+        breaker_cooldown=10.0,
+        breaker_max_opens=5,
+        probe_wait=2.0,
+        robots_fetcher=None,
+        shards=1,
+        clock=time.monotonic,
+        sleep=asyncio.sleep,
+    ):
+        self.max_per_host = max_per_host
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.latency_target = latency_target
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.breaker_max_opens = breaker_max_opens
+        self.probe_wait = probe_wait
+        self.robots_fetcher = robots_fetcher
+        self.shards = shards
+        self.clock = clock
+        self.sleep = sleep
+        self.hosts = {}
+        self.robots = {}
+        self.lock = threading.Lock()
+
+    async def get_crawl_delay(self, url):
+        if not self.robots_fetcher:
+            return 0
+
+        parsed_url = urlparse(url)
+        robots_url = f"{parsed_url.scheme}://{parsed_url.netloc}/robots.txt"
+        if robots_url not in self.robots:
+            self.robots[robots_url] = asyncio.ensure_future(
+                asyncio.to_thread(self.robots_fetcher, robots_url)
+            )
+
+        robots_txt = await self.robots[robots_url]
+        if not robots_txt:
+            return 0
+
+        parser = urllib.robotparser.RobotFileParser()
+        parser.parse(robots_txt.splitlines())
+        return parser.crawl_delay("*") or 0
+
+    async def get_host(self, url):
+        host = urlparse(url).netloc
+        if host not in self.hosts:
+            crawl_delay = await self.get_crawl_delay(url)
+            if host not in self.hosts:
+                delay = max(self.min_delay, float(crawl_delay) * self.shards)
+                if crawl_delay:
+                    logger.info(f"Using robots.txt Crawl-delay of {delay}s for {host}")
+                self.hosts[host] = HostState(self.max_per_host, delay, self.clock)
+        return self.hosts[host]
+
+    async def acquire(self, url):
+        state = await self.get_host(url)
+
+        while state.active >= max(1, int(state.limit)):
+            waiter = asyncio.get_running_loop().create_future()
+            state.waiters.append(waiter)
+            await waiter
+        state.active += 1
+
+        with self.lock:
+            wait = max(state.bucket.reserve(), state.paused_until - self.clock())
+        if wait > 0:
+            await self.sleep(wait)
+        return state
+
+    def release(self, state):
+        state.active -= 1
+        while state.waiters:
+            waiter = state.waiters.pop(0)
+            if not waiter.done():
+                waiter.set_result(None)
+                break
+
+    @asynccontextmanager
+    async def slot(self, url):
+        """Hold one of the host's request slots for the duration of the block."""
+        state = await self.acquire(url)
+        try:
+            yield state
+        finally:
+            self.release(state)
+
+    def report(self, url, status, latency, retry_after=None):
+        """
+        Feed a response back into the host's limits. Safe to call from any thread.
+        """
+        state = self.hosts.get(urlparse(url).netloc)
+        if not state:
+            return
+
+        with self.lock:
+            if status in THROTTLE_STATUS_CODES:
+                state.limit = max(1, state.limit / 2)
+                state.set_delay(
+                    min(
+                        self.max_delay * self.shards,
+                        max(state.delay * 2, float(self.shards)),
+                    )
+                )
+                if retry_after:
+                    state.paused_until = self.clock() + min(self.max_delay, retry_after)
+                logger.warning(
+                    f"Throttled by {urlparse(url).netloc}, backing off to "
+                    f"{int(state.limit)} connections and {state.delay:.1f}s delay"
+                )
+            elif latency > self.latency_target:
+                state.limit = max(1, state.limit * 0.9)
+            else:
+                state.limit = min(self.max_per_host, state.limit + 1 / state.limit)
+                if state.delay > state.base_delay:
+                    delay = state.delay * 0.9
+                    if delay <= max(state.base_delay * 1.05, 0.05):
+                        delay = state.base_delay
+                    state.set_delay(delay)
+
+    def get_pause(self, url):
+        """
+        Seconds to hold off starting work on url's host, or math.inf if the
+        host was given up on. Zero lets the work start, maybe as the probe.
+        """
+        state = self.hosts.get(urlparse(url).netloc)
+        if not state:
+            return 0
+
+        with self.lock:
+            if state.opens >= self.breaker_max_opens:
+                return math.inf
+
+            now = self.clock()
+            pause = max(state.open_until, state.paused_until) - now
+            if pause > 0:
+                return pause
+
+            if state.failures >= self.breaker_threshold:
+                if state.probing:
+                    return self.probe_wait
+                state.probing = True
+            return 0
+
+    def record_success(self, url):
+        state = self.hosts.get(urlparse(url).netloc)
+        if not state:
+            return
+
+        with self.lock:
+            if state.failures >= self.breaker_threshold:
+                logger.info(f"{urlparse(url).netloc} recovered, resuming")
+            state.failures = 0
+            state.opens = 0
+            state.probing = False
+
+    def record_failure(self, url):
+        """Count a failed work item on the host, opening its breaker if needed."""
+        host = urlparse(url).netloc
+        state = self.hosts.get(host)
+        if not state:
+            return
+
+        with self.lock:
+            state.failures += 1
+            now = self.clock()
+            if state.failures < self.breaker_threshold or state.open_until > now:
+                return
+
+            # Only the probe or the first failure past the threshold reopens,
+            # not requests that were already in flight when it opened
+            if state.opens and not state.probing:
+                return
+
+            state.probing = False
+            state.opens += 1
+            if state.opens >= self.breaker_max_opens:
+                logger.error(f"Giving up on {host} after {state.failures} failures")
+                return
+
+            cooldown = self.breaker_cooldown * 2 ** (state.opens - 1)
+            state.open_until = now + cooldown
+            logger.warning(
+                f"{host} failed {state.failures} times in a row, "
+                f"pausing it for {cooldown:g}s"
+            )
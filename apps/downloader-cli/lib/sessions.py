@@ -0,0 +1,25 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_TIMEOUT = 10
+
+
+class PooledSession(requests.Session):
+    """
+    HTTP session with per-host keep-alive connection pools.
+
+    pool_hosts is the number of host pools kept open and pool_size the
+    number of connections reused per host. Requests without an explicit
+    timeout use the session timeout.
+    """
+
+    def __init__(self, pool_hosts=20, pool_size=10, timeout=DEFAULT_TIMEOUT):
+        super().__init__()
+        self.timeout = timeout
+        adapter = HTTPAdapter(pool_connections=pool_hosts, pool_maxsize=pool_size)
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
@@ -0,0 +1,128 @@
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+from lib.crawler import Crawler, PAGE
+
+STOP = None
+
+logger = logging.getLogger()
+
+
+def get_shard(url, shards):
+    """Stable shard of a URL, the same in every process and every run."""
+    parsed_url = urlparse(url)
+    normalized_url = parsed_url._replace(
+        scheme=parsed_url.scheme.lower(),
+        netloc=parsed_url.netloc.lower(),
+        fragment="",
+    ).geturl()
+    digest = hashlib.blake2b(normalized_url.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shards
+
+
+class ShardState:
+    """
+    State shared by the processes of a sharded crawl.
+
+    Every shard has an inbox queue for URLs forwarded to it. outstanding
+    counts work that is queued, in flight or being forwarded anywhere, plus
+    one start-up token per shard, so it only reaches zero once every shard
+    is idle and no message is on its way, which sets done.
+    """
+
+    def __init__(self, shards, context):
+        self.shards = shards
+        self.inboxes = [context.Queue() for _ in range(shards)]
+        self.outstanding = context.Value("q", shards)
+        self.done = context.Event()
+
+    def add_work(self):
+        with self.outstanding.get_lock():
+            self.outstanding.value += 1
+
+    def finish_work(self):
+        with self.outstanding.get_lock():
+            self.outstanding.value -= 1
+            if self.outstanding.value == 0:
+                self.done.set()
+
+    def stop(self):
+        for inbox in self.inboxes:
+            inbox.put(STOP)
+
+
+class ShardCrawler(Crawler):
+    """
+    Crawler owning the URLs that hash to one shard.
+
+    URLs of other shards are forwarded to their inbox instead of being
+    queued, and URLs forwarded here are received on a background thread.
+    A bounded cache of recently forwarded URLs avoids resending the links
+    every page has in common. The crawl ends when the coordinator sends
+    STOP, not when the local frontier runs empty.
+    """
+
+    def __init__(self, shard, state, *args, forward_cache_size=100_000, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.shard = shard
+        self.state = state
+        self.forward_cache_size = forward_cache_size
+        self.forwarded = OrderedDict()
+        self.stopped = None
+
+    def add(self, url, kind=PAGE, depth=0):
+        canonical_url = self.get_canonical_url(url)
+        owner = get_shard(canonical_url, self.state.shards)
+        if owner != self.shard:
+            self.forward(owner, canonical_url, kind, depth)
+            return False
+        return super().add(url, kind, depth)
+
+    def forward(self, owner, url, kind, depth):
+        if url in self.forwarded:
+            self.forwarded.move_to_end(url)
+            return
+
+        self.forwarded[url] = None
+        if len(self.forwarded) > self.forward_cache_size:
+            self.forwarded.popitem(last=False)
+
+        self.state.add_work()
+        self.state.inboxes[owner].put((url, kind, depth))
+
+    def put(self, url, kind, depth):
+        self.state.add_work()
+        super().put(url, kind, depth)
+
+    def finish(self):
+        super().finish()
+        self.state.finish_work()
+
+    def receive(self):
+        inbox = self.state.inboxes[self.shard]
+        while True:
+            message = inbox.get()
+            if message is STOP:
+                self.loop.call_soon_threadsafe(self.stopped.set)
+                return
+            self.loop.call_soon_threadsafe(self.accept, *message)
+
+    def accept(self, url, kind, depth):
+        super().add(url, kind, depth)
+        self.state.finish_work()
+
+    async def wait(self):
+        self.stopped = asyncio.Event()
+        threading.Thread(target=self.receive, daemon=True).start()
+
+        # Seeds and pending work are queued, release this shard's start-up token
+        self.state.finish_work()
+        await self.stopped.wait()
+
+        # Nothing is left in flight, don't block exit flushing queues to peers
+        for inbox in self.state.inboxes:
+            inbox.cancel_join_thread()
@@ -0,0 +1,130 @@
+import gzip
+import logging
+import re
+import xml.etree.ElementTree as ElementTree
+from collections import deque
+from datetime import datetime, timezone
+
+GZIP_MAGIC = b"\x1f\x8b"
+ROBOTS_SITEMAP_PATTERN = re.compile(r"^\s*sitemap\s*:\s*(\S+)", re.IGNORECASE)
+
+logger = logging.getLogger()
+
+
+def get_robots_sitemaps(robots_txt):
+    """Sitemap URLs listed in a robots.txt."""
+    return [
+        match.group(1)
+        for match in map(ROBOTS_SITEMAP_PATTERN.match, robots_txt.splitlines())
+        if match
+    ]
+
+
+def parse_lastmod(value):
+    """Convert a W3C datetime, like 2024-01-31 or 2024-01-31T10:00Z, to a timestamp."""
+    if not value:
+        return None
+
+    value = value.strip()
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    try:
+        lastmod = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+    if lastmod.tzinfo is None:
+        lastmod = lastmod.replace(tzinfo=timezone.utc)
+    return lastmod.timestamp()
+
+
+class PeekedStream:
+    """Binary stream with its first bytes read ahead and put back."""
+
+    def __init__(self, stream, size):
+        self.stream = stream
+        self.head = stream.read(size) or b""
+
+    def read(self, size=-1):
+        head, self.head = self.head, b""
+        if size is None or size < 0:
+            return head + (self.stream.read() or b"")
+        if len(head) >= size:
+            self.head = head[size:]
+            return head[:size]
+        return head + (self.stream.read(size - len(head)) or b"")
+
+
+def get_local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def parse_sitemap(stream):
+    """
+    Stream the entries of a sitemap or sitemap index.
+
+    Yields (is_index, loc, lastmod) for every <sitemap> or <url> entry and
+    clears each entry once it is read, so memory stays flat however big
+    the sitemap is. Gzip-compressed sitemaps are detected and unpacked.
+    """
+    stream = PeekedStream(stream, len(GZIP_MAGIC))
+    if stream.head == GZIP_MAGIC:
+        stream = gzip.GzipFile(fileobj=stream)
+
+    root = None
+    loc = None
+    lastmod = None
+    for event, element in ElementTree.iterparse(stream, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = element
+            continue
+
+        name = get_local_name(element.tag)
+        if name == "loc":
+            loc = (element.text or "").strip()
+        elif name == "lastmod":
+            lastmod = parse_lastmod(element.text)
+        elif name in ("url", "sitemap"):
+            if loc:
+                yield name == "sitemap", loc, lastmod
+            loc = None
+            lastmod = None
+            root.clear()
+
+
+def iter_sitemap_urls(sitemap_urls, open_sitemap, max_sitemaps=1000):
+    """
+    Yield (url, lastmod) for every page in the sitemaps, following indexes.
+
+    open_sitemap(url) returns a binary stream or None when the sitemap
+    can't be fetched. Each sitemap is read at most once and at most
+    max_sitemaps are read in total, guarding against index loops.
+    """
+    queue = deque(sitemap_urls)
+    read = set()
+
+    while queue and len(read) < max_sitemaps:
+        sitemap_url = queue.popleft()
+        if sitemap_url in read:
+            continue
+        read.add(sitemap_url)
+
+        stream = open_sitemap(sitemap_url)
+        if stream is None:
+            continue
+
+        count = 0
+        try:
+            for is_index, loc, lastmod in parse_sitemap(stream):
+                if is_index:
+                    queue.append(loc)
+                else:
+                    count += 1
+                    yield loc, lastmod
+        except (ElementTree.ParseError, OSError, EOFError) as e:
+            logger.warning(f"Error reading sitemap {sitemap_url}: {e}")
+        finally:
+            stream.close()
+
+        logger.info(f"Read {count} URLs from sitemap {sitemap_url}")
@@ -0,0 +1,34 @@
+import sqlite3
+import threading
+
+
+class SqliteStore:
+    """
+    Base of the SQLite-backed stores kept under the output directory.
+
+    The connection is shared by worker threads, which hold lock while using
+    it. Writes are committed in batches: subclasses call wrote() after each
+    one, and close() commits the rest.
+    """
+
+    def __init__(self, path, schema, commit_every=100):
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(schema)
+        self.lock = threading.Lock()
+        self.commit_every = commit_every
+        self.pending = 0
+
+    def wrote(self):
+        """Count a write made under the lock, committing every commit_every."""
+        self.pending += 1
+        if self.pending >= self.commit_every:
+            self.commit()
+
+    def commit(self):
+        self.connection.commit()
+        self.pending = 0
+
+    def close(self):
+        with self.lock:
+            self.commit()
+            self.connection.close()
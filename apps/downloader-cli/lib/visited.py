@@ -0,0 +1,102 @@
+import hashlib
+import math
+
+from lib.sqlite_store import SqliteStore
+
+
+class VisitedSet:
+    """In-memory visited-URL index with constant time lookups."""
+
+    def __init__(self, urls=()):
+        self.urls = set(urls)
+
+    def __contains__(self, url):
+        return url in self.urls
+
+    def __len__(self):
+        return len(self.urls)
+
+    def add(self, url):
+        self.urls.add(url)
+
+    def clear(self):
+        self.urls.clear()
+
+    def close(self):
+        pass
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter sized for a capacity and false positive rate."""
+
+    def __init__(self, capacity=1_000_000, error_rate=0.01):
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray(math.ceil(self.size / 8))
+
+    def positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def __contains__(self, key):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self.positions(key))
+
+    def add(self, key):
+        for p in self.positions(key):
+            self.bits[p >> 3] |= 1 << (p & 7)
+
+
+class DiskVisitedSet(SqliteStore):
+    """
+    SQLite-backed visited-URL index for very large crawls.
+
+    A Bloom filter answers most lookups for unseen URLs without touching
+    the database, and SQLite gives the exact answer when the filter reports
+    a possible match, so memory stays bounded by the filter size.
+    """
+
+    def __init__(self, path, capacity=1_000_000, commit_every=1000):
+        super().__init__(
+            path,
+            "CREATE TABLE IF NOT EXISTS visited (url TEXT PRIMARY KEY) WITHOUT ROWID",
+            commit_every,
+        )
+        self.capacity = capacity
+        self.bloom = BloomFilter(capacity)
+        self.count = 0
+
+        for (url,) in self.connection.execute("SELECT url FROM visited"):
+            self.bloom.add(url)
+            self.count += 1
+
+    def __contains__(self, url):
+        with self.lock:
+            if url not in self.bloom:
+                return False
+
+            cursor = self.connection.execute(
+                "SELECT 1 FROM visited WHERE url = ?", (url,)
+            )
+            return cursor.fetchone() is not None
+
+    def __len__(self):
+        return self.count
+
+    def add(self, url):
+        with self.lock:
+            cursor = self.connection.execute(
+                "INSERT OR IGNORE INTO visited (url) VALUES (?)", (url,)
+            )
+            if cursor.rowcount:
+                self.bloom.add(url)
+                self.count += 1
+                self.wrote()
+
+    def clear(self):
+        with self.lock:
+            self.connection.execute("DELETE FROM visited")
+            self.commit()
+            self.bloom = BloomFilter(self.capacity)
+            self.count = 0
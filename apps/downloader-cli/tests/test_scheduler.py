@@ -0,0 +1,267 @@
+import asyncio
+import math
+
+from lib.scheduler import HostScheduler, TokenBucket
+
+URL = "https://example.com/page"
+OTHER_URL = "https://example.org/page"
+
+
+class FakeClock:
+    """A clock that only moves when sleep() is awaited or advance() is called."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+    async def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.advance(seconds)
+        await asyncio.sleep(0)
+
+
+def get_scheduler(clock, **kwargs):
+    return HostScheduler(clock=clock, sleep=clock.sleep, **kwargs)
+
+
+def test_token_bucket_spaces_reservations():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=0.5, clock=clock)
+
+    assert bucket.reserve() == 0
+    assert bucket.reserve() == 2
+    assert bucket.reserve() == 4
+
+    clock.advance(4)
+    assert bucket.reserve() == 2
+
+
+def test_token_bucket_without_rate_never_waits():
+    bucket = TokenBucket(clock=FakeClock())
+
+    assert [bucket.reserve() for _ in range(5)] == [0] * 5
+
+
+def test_slots_are_capped_per_host():
+    clock = FakeClock()
+    scheduler = get_scheduler(clock, max_per_host=2)
+    active = {URL: 0, OTHER_URL: 0}
+    peak = {URL: 0, OTHER_URL: 0}
+
+    async def work(url):
+        async with scheduler.slot(url):
+            active[url] += 1
+            peak[url] = max(peak[url], active[url])
+            for _ in range(3):
+                await asyncio.sleep(0)
+            active[url] -= 1
+
+    async def crawl():
+        await asyncio.gather(*(work(url) for url in [URL, OTHER_URL] * 5))
+
+    asyncio.run(crawl())
+    assert peak == {URL: 2, OTHER_URL: 2}
+    assert clock.sleeps == []
+
+
+def test_crawl_delay_spaces_requests():
+    clock = FakeClock()
+    robots_txt = "User-agent: *\nCrawl-delay: 3\n"
+    scheduler = get_scheduler(clock, robots_fetcher=lambda url: robots_txt)
+
+    async def crawl():
+        for _ in range(3):
+            async with scheduler.slot(URL):
+                pass
+
+    asyncio.run(crawl())
+    assert clock.sleeps == [3, 3]
+
+
+def test_min_delay_overrides_a_shorter_crawl_delay():
+    clock = FakeClock()
+    robots_txt = "User-agent: *\nCrawl-delay: 1\n"
+    scheduler = get_scheduler(clock, min_delay=5, robots_fetcher=lambda url: robots_txt)
+
+    async def crawl():
+        for _ in range(2):
+            async with scheduler.slot(URL):
+                pass
+
+    asyncio.run(crawl())
+    assert clock.sleeps == [5]
+
+
+def test_shards_share_the_crawl_delay():
+    clock = FakeClock()
+    robots_txt = "User-agent: *\nCrawl-delay: 3\n"
+    scheduler = get_scheduler(clock, shards=2, robots_fetcher=lambda url: robots_txt)
+
+    async def crawl():
+        for _ in range(2):
+            async with scheduler.slot(URL):
+                pass
+
+    asyncio.run(crawl())
+    assert clock.sleeps == [6]
+
+
+def test_throttling_halves_concurrency_and_honors_retry_after():
+    clock = FakeClock()
+    scheduler = get_scheduler(clock, max_per_host=4)
+    state = asyncio.run(scheduler.get_host(URL))
+
+    scheduler.report(URL, 429, 0.1)
+    assert state.limit == 2
+    assert state.delay == 1
+
+    scheduler.report(URL, 503, 0.1, retry_after=30)
+    assert state.limit == 1
+    assert state.delay == 2
+    assert scheduler.get_pause(URL) == 30
+
+    clock.advance(30)
+    assert scheduler.get_pause(URL) == 0
+
+
+def test_shards_share_the_throttling_delay():
+    clock = FakeClock()
+    scheduler = get_scheduler(clock, shards=3, max_delay=10)
+    state = asyncio.run(scheduler.get_host(URL))
+
+    scheduler.report(URL, 429, 0.1)
+    assert state.delay == 3
+
+    for _ in range(5):
+        scheduler.report(URL, 429, 0.1)
+    assert state.delay == 30
+
+
+def test_retry_after_delays_the_next_request():
+    clock = FakeClock()
+    scheduler = get_scheduler(clock)
+    asyncio.run(scheduler.get_host(URL))
+    scheduler.report(URL, 429, 0.1, retry_after=10)
+
+    async def crawl():
+        async with scheduler.slot(URL):
+            pass
+
+    asyncio.run(crawl())
+    assert clock.sleeps == [10]
+
+
+def test_healthy_responses_recover_to_max_per_host():
+    clock = FakeClock()
+    scheduler = get_scheduler(clock, max_per_host=4)
+    state = asyncio.run(scheduler.get_host(URL))
+    scheduler.report(URL, 429, 0.1)
+    scheduler.report(URL, 429, 0.1)
+    assert state.limit == 1
+    assert state.delay == 2
+
+    for _ in range(50):
+        scheduler.report(URL, 200, 0.1)
+    assert state.limit == 4
+    assert state.delay == 0
+
+
+def test_slow_responses_shrink_concurrency():
+    clock = FakeClock()
+    scheduler = get_scheduler(clock, max_per_host=4, latency_target=2)
+    state = asyncio.run(scheduler.get_host(URL))
+
+    scheduler.report(URL, 200, 5)
+    assert math.isclose(state.limit, 3.6)
+
+    for _ in range(50):
+        scheduler.report(URL, 200, 5)
+    assert state.limit == 1
+
+
+def test_breaker_opens_after_consecutive_failures():
+    clock = FakeClock()
+    scheduler = get_scheduler(clock, breaker_threshold=3, breaker_cooldown=10)
+    asyncio.run(scheduler.get_host(URL))
+
+    scheduler.record_failure(URL)
+    scheduler.record_failure(URL)
+    assert scheduler.get_pause(URL) == 0
+
+    scheduler.record_failure(URL)
+    assert scheduler.get_pause(URL) == 10
+    assert scheduler.get_pause(OTHER_URL) == 0
+
+    # Failures of requests in flight when it opened don't extend the pause
+    scheduler.record_failure(URL)
+    assert scheduler.get_pause(URL) == 10
+
+
+def test_success_resets_the_failure_count():
+    clock = FakeClock()
+    scheduler = get_scheduler(clock, breaker_threshold=3)
+    asyncio.run(scheduler.get_host(URL))
+
+    for _ in range(2):
+        scheduler.record_failure(URL)
+    scheduler.record_success(URL)
+    for _ in range(2):
+        scheduler.record_failure(URL)
+    assert scheduler.get_pause(URL) == 0
+
+
+def test_breaker_lets_one_probe_through_and_closes_on_success():
+    clock = FakeClock()
+    scheduler = get_scheduler(
+        clock, breaker_threshold=2, breaker_cooldown=10, probe_wait=2
+    )
+    asyncio.run(scheduler.get_host(URL))
+    scheduler.record_failure(URL)
+    scheduler.record_failure(URL)
+
+    clock.advance(10)
+    assert scheduler.get_pause(URL) == 0
+    assert scheduler.get_pause(URL) == 2
+
+    scheduler.record_success(URL)
+    assert scheduler.get_pause(URL) == 0
+    assert scheduler.get_pause(URL) == 0
+
+
+def test_failed_probe_reopens_with_a_doubled_cooldown():
+    clock = FakeClock()
+    scheduler = get_scheduler(
+        clock, breaker_threshold=2, breaker_cooldown=10, breaker_max_opens=5
+    )
+    asyncio.run(scheduler.get_host(URL))
+    scheduler.record_failure(URL)
+    scheduler.record_failure(URL)
+
+    clock.advance(10)
+    assert scheduler.get_pause(URL) == 0
+    scheduler.record_failure(URL)
+    assert scheduler.get_pause(URL) == 20
+
+
+def test_breaker_gives_up_after_max_opens():
+    clock = FakeClock()
+    scheduler = get_scheduler(
+        clock, breaker_threshold=1, breaker_cooldown=10, breaker_max_opens=2
+    )
+    asyncio.run(scheduler.get_host(URL))
+    scheduler.record_failure(URL)
+    assert scheduler.get_pause(URL) == 10
+
+    clock.advance(10)
+    assert scheduler.get_pause(URL) == 0
+    scheduler.record_failure(URL)
+    assert scheduler.get_pause(URL) == math.inf
+
+    clock.advance(1000)
+    assert scheduler.get_pause(URL) == math.inf